@@ -0,0 +1,119 @@
+from itertools import islice
+
+from django.db import transaction
+
+from api.models import BeerTapDispenserHistory, DispenserUsageStats, UsageAlert
+from api.timestamps import SECOND, now_us
+
+
+class UsageAnomalyScanner:
+    """
+    Incremental scan of the usages, meant to run periodically as a background job.
+    The usages closed since the last scan are added to the running duration stats of their dispenser
+    and the outliers are flagged, then the usages still open are checked against the max open time.
+    Both steps read partial indexes, so the work is proportional to what changed since the last scan
+    """
+
+    def __init__(self, batch_size, max_open_seconds, zscore):
+        self.batch_size = batch_size
+        self.max_open_seconds = max_open_seconds
+        self.zscore = zscore
+
+    def scan(self):
+        processed, outliers = self.process_closed_usages()
+        open_too_long = self.scan_open_usages()
+        return {'processed': processed, 'outliers': outliers, 'open_too_long': open_too_long}
+
+    def get_stats(self, dispenser_ids, lock=False):
+        queryset = DispenserUsageStats.objects.select_for_update() if lock else DispenserUsageStats.objects
+        stats = queryset.in_bulk(dispenser_ids)
+        return {pk: stats.get(pk) or DispenserUsageStats(dispenser_id=pk) for pk in dispenser_ids}
+
+    def process_closed_usages(self):
+        """
+            Processes the closed usages in batches, each batch is a transaction that updates the stats,
+            creates the alerts and marks the usages as processed
+            :return: returns the number of processed usages and outliers
+        """
+        processed = outliers = 0
+        while True:
+            with transaction.atomic():
+                # the batches locked by another scanner are skipped
+                batch = list(
+                    BeerTapDispenserHistory.objects
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .filter(stats_processed=False, closed_at__isnull=False)
+                    .order_by('id')
+                    .values_list('id', 'dispenser_id', 'opened_at_us', 'closed_at_us')[:self.batch_size]
+                )
+                if not batch:
+                    return processed, outliers
+
+                stats = self.get_stats({dispenser_id for _, dispenser_id, _, _ in batch}, lock=True)
+                alerts = []
+                for usage_id, dispenser_id, opened_at_us, closed_at_us in batch:
+                    duration = (closed_at_us - opened_at_us) / SECOND
+                    dispenser_stats = stats[dispenser_id]
+                    # the usage is compared with the previous ones before being added to the stats
+                    zscore = dispenser_stats.get_zscore(duration)
+                    if zscore is not None and abs(zscore) > self.zscore:
+                        alerts.append(UsageAlert(
+                            dispenser_id=dispenser_id,
+                            usage_id=usage_id,
+                            kind=UsageAlert.UsageAlertKind.DURATION_OUTLIER,
+                            duration=duration,
+                            zscore=zscore
+                        ))
+                    dispenser_stats.add(duration)
+
+                DispenserUsageStats.objects.bulk_create([s for s in stats.values() if s._state.adding])
+                DispenserUsageStats.objects.bulk_update(
+                    [s for s in stats.values() if not s._state.adding], ['count', 'mean', 'm2']
+                )
+                UsageAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+                BeerTapDispenserHistory.objects.filter(id__in=[row[0] for row in batch]).update(stats_processed=True)
+
+            processed += len(batch)
+            outliers += len(alerts)
+
+    def scan_open_usages(self):
+        """
+            Streams the usages still open and flags the ones open longer than max_open_seconds or
+            than the usual duration of their dispenser
+            :return: returns the number of usages flagged
+        """
+        now = now_us()
+        open_usages = (
+            BeerTapDispenserHistory.objects
+            .filter(closed_at__isnull=True)
+            .order_by()
+            .values_list('id', 'dispenser_id', 'opened_at_us')
+            .iterator(chunk_size=self.batch_size)
+        )
+        flagged = 0
+        while True:
+            chunk = list(islice(open_usages, self.batch_size))
+            if not chunk:
+                return flagged
+
+            stats = self.get_stats({dispenser_id for _, dispenser_id, _ in chunk})
+            flagged_before = set(UsageAlert.objects.filter(
+                usage_id__in=[usage_id for usage_id, _, _ in chunk],
+                kind=UsageAlert.UsageAlertKind.OPEN_TOO_LONG
+            ).values_list('usage_id', flat=True))
+            alerts = []
+            for usage_id, dispenser_id, opened_at_us in chunk:
+                if usage_id in flagged_before:
+                    continue
+                duration = (now - opened_at_us) / SECOND
+                zscore = stats[dispenser_id].get_zscore(duration)
+                if duration > self.max_open_seconds or (zscore is not None and zscore > self.zscore):
+                    alerts.append(UsageAlert(
+                        dispenser_id=dispenser_id,
+                        usage_id=usage_id,
+                        kind=UsageAlert.UsageAlertKind.OPEN_TOO_LONG,
+                        duration=duration,
+                        zscore=zscore
+                    ))
+            UsageAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+            flagged += len(alerts)
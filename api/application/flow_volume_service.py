@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, OuterRef, Subquery, DecimalField, PositiveIntegerField, Q
+from rest_framework.exceptions import ValidationError
+
+from api.models import BeerTapDispenser, BeerTapDispenserHistory
+
+
+class FlowVolumeUpdater:
+    """
+    Changes the flow volume of many dispensers of a venue at once, the dispensers are updated with
+    one UPDATE using a CASE by id. The usages copy the flow volume when they are opened, so the
+    closed usages and the spending of the closed dispensers never change:
+    - keep: the open usages keep the flow volume they were opened with
+    - reprice: the open usages take the new flow volume, those dispensers get a new version
+    """
+    KEEP = 'keep'
+    REPRICE = 'reprice'
+
+    def update(self, venue_code, flow_volumes, open_usages=KEEP):
+        """
+            :param venue_code: venue of the dispensers
+            :param flow_volumes: dict of dispenser id and its new flow volume
+            :param open_usages: keep or reprice
+            :return: returns the number of dispensers updated and the number of open usages repriced
+        """
+        with transaction.atomic():
+            # the dispensers are locked in id order (two updates can't deadlock), an open() at the
+            # same time waits and its usage copies the new flow volume read from the locked row
+            ids = set(
+                BeerTapDispenser.objects
+                .select_for_update()
+                .filter(venue_id=venue_code, id__in=flow_volumes)
+                .order_by('id')
+                .values_list('id', flat=True)
+            )
+            missing = set(flow_volumes) - ids
+            if missing:
+                raise ValidationError({'error': f"dispensers not found: {', '.join(sorted(map(str, missing)))}"})
+
+            whens = [When(id=dispenser_id, then=Value(volume)) for dispenser_id, volume in flow_volumes.items()]
+            changes = {'flow_volume': Case(*whens, output_field=DecimalField(max_digits=5, decimal_places=4))}
+            if open_usages == self.REPRICE:
+                # the spending of the open dispensers changes, the closed ones keep their etag
+                is_open = Q(status=BeerTapDispenser.BeerTapDispenserStatus.OPEN)
+                changes['version'] = Case(
+                    When(is_open, then=F('version') + 1),
+                    default=F('version'),
+                    output_field=PositiveIntegerField()
+                )
+                changes['updated_at'] = Case(When(is_open, then=Value(datetime.now())), default=F('updated_at'))
+            updated = BeerTapDispenser.objects.filter(id__in=ids).update(**changes)
+
+            repriced = 0
+            if open_usages == self.REPRICE:
+                repriced = BeerTapDispenserHistory.objects.filter(
+                    dispenser_id__in=ids,
+                    closed_at__isnull=True
+                ).update(
+                    flow_volume=Subquery(
+                        BeerTapDispenser.objects.filter(pk=OuterRef('dispenser_id')).values('flow_volume')[:1]
+                    )
+                )
+        return {'updated': updated, 'repriced_usages': repriced}
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.db import DatabaseError
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class HealthService:
+    """
+    Liveness and readiness checks for the load balancer probes.
+    The readiness check (SELECT 1 and pending migrations) runs at most once per interval,
+    the probes in between get the cached result so they don't add traffic to the database.
+    The check runs out of the lock, while it runs the other probes get the previous result, or
+    unavailable once the check takes longer than the interval (the database hangs)
+    """
+
+    def __init__(self, database, interval):
+        self.database = database
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.result = None
+        self.expires_at = 0
+        self.checking_since = None
+        self.migrations_applied = False
+        self.checks = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def liveness(self):
+        return {'status': 'alive'}
+
+    def readiness(self):
+        """
+            Returns the readiness of the service, checking the database if the cached result expired
+            :return: returns the check result and True if the service is ready
+        """
+        with self.lock:
+            now = time.monotonic()
+            cached = now < self.expires_at
+            checking_since = self.checking_since
+            run = not cached and checking_since is None
+            if run:
+                self.checking_since = now
+
+        if run:
+            try:
+                self.result = result = self.check()
+                self.expires_at = time.monotonic() + self.interval
+            finally:
+                self.checking_since = None
+        elif not cached and (self.result is None or now - checking_since > self.interval):
+            # the check of another probe is still waiting for the database
+            result = self.get_result(
+                {'ok': False, 'error': 'check in progress', 'latency_ms': round((now - checking_since) * 1000, 3)},
+                {'ok': False, 'pending': None}
+            )
+        else:
+            result = self.result
+
+        result = dict(result, cached=not run, stats=self.get_stats(), pool=self.get_pool_stats())
+        return result, result['status'] == 'ok'
+
+    def check(self):
+        start = time.perf_counter()
+        database, migrations = {'ok': True}, {'ok': True, 'pending': 0}
+        try:
+            with self.database.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            if not self.migrations_applied:
+                migrations = self.check_migrations()
+        except DatabaseError as e:
+            # the message can contain the host of the database, the probes only get its type
+            logger.warning('readiness check failed: %s', e)
+            database = {'ok': False, 'error': type(e).__name__}
+            migrations = {'ok': False, 'pending': None}
+        latency = time.perf_counter() - start
+        database['latency_ms'] = round(latency * 1000, 3)
+
+        result = self.get_result(database, migrations)
+        self.checks += 1
+        self.failures += result['status'] != 'ok'
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        return result
+
+    def get_result(self, database, migrations):
+        return {
+            'status': 'ok' if database['ok'] and migrations['ok'] else 'unavailable',
+            'database': database,
+            'migrations': migrations,
+            'checked_at': datetime.now().isoformat()
+        }
+
+    def check_migrations(self):
+        """
+            Counts the pending migrations, once they are applied they are not checked again
+            until the process restarts
+        """
+        executor = MigrationExecutor(self.database)
+        pending = len(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+        self.migrations_applied = pending == 0
+        return {'ok': self.migrations_applied, 'pending': pending}
+
+    def get_stats(self):
+        return {
+            'checks': self.checks,
+            'failures': self.failures,
+            'interval': self.interval,
+            'latency_ms': {
+                'avg': round(self.latency_total / self.checks * 1000, 3) if self.checks else None,
+                'max': round(self.latency_max * 1000, 3)
+            }
+        }
+
+    def get_pool_stats(self):
+        """
+            Django keeps one persistent connection per thread, these are the stats of the current one
+        """
+        return {
+            'vendor': self.database.vendor,
+            'conn_max_age': self.database.settings_dict.get('CONN_MAX_AGE'),
+            'conn_health_checks': self.database.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connected': self.database.connection is not None
+        }
@@ -0,0 +1,159 @@
+from decimal import Decimal
+
+from api.domain.dispenser import usage_cost
+from api.models import BeerTapDispenserHistory
+from api import timestamps
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# flow_volume has 4 decimal places, it is kept in the arrays as an integer of 1/10000 liters
+FLOW_SCALE = 4
+
+
+class PricingScenario:
+    __slots__ = ('name', 'price_by_liter', 'flow_volumes')
+
+    def __init__(self, name, price_by_liter, flow_volumes=None):
+        """
+            :param name: name of the scenario in the report
+            :param price_by_liter: price of a liter in the scenario
+            :param flow_volumes: dict of dispenser id and the flow volume it would have, the other
+            dispensers keep the flow volume of each usage
+        """
+        self.name = name
+        self.price_by_liter = Decimal(price_by_liter)
+        self.flow_volumes = flow_volumes or {}
+
+
+class PricingSimulator:
+    """
+    What-if analysis of the revenue of the history with other prices and flow volumes.
+    The usages are read in chunks with a server-side cursor and reduced with numpy to the distinct
+    (dispenser, flow volume, billable seconds) combinations and how many usages each one has,
+    so a scenario prices each distinct (flow volume, seconds) pair once with the same rounding
+    than BeerTapDispenserHistory.total_spent and sums the costs as integers of 1/1000
+    """
+
+    def __init__(self, max_pour_seconds=None, chunk_size=100000, now_us=None):
+        if np is None:
+            raise RuntimeError('numpy is required by the pricing simulator')
+        self.max_pour_seconds = max_pour_seconds
+        self.chunk_size = chunk_size
+        self.now_us = now_us or timestamps.now_us()
+        # position of each dispenser id in the amounts arrays
+        self.indexes = {}
+        # one row by combination: dispenser index, flow volume units, seconds and usages count
+        self.combinations = np.zeros((0, 4), dtype=np.int64)
+
+    def load(self, queryset=None):
+        """
+            Reads the usages and reduces them to the combinations
+            :param queryset: usages to analyze, all the history by default
+            :return: returns the number of usages read
+        """
+        queryset = queryset if queryset is not None else BeerTapDispenserHistory.objects.all()
+        rows = queryset.order_by().values_list('dispenser_id', 'opened_at_us', 'closed_at_us', 'flow_volume')
+        chunks = []
+        chunk = []
+        total = 0
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                chunks.append(self.reduce(chunk))
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(self.reduce(chunk))
+            total += len(chunk)
+
+        if chunks:
+            self.combinations = self.merge(np.concatenate(chunks))
+        return total
+
+    def reduce(self, chunk):
+        dispenser_ids, opened_at, closed_at, flow_volumes = zip(*chunk)
+        count = len(chunk)
+        dispensers = np.fromiter(
+            (self.indexes.setdefault(dispenser_id, len(self.indexes)) for dispenser_id in dispenser_ids),
+            dtype=np.int64,
+            count=count
+        )
+        opened_at = np.fromiter(opened_at, dtype=np.int64, count=count)
+        # the open usages are counted until now
+        closed_at = np.fromiter((self.now_us if value is None else value for value in closed_at), np.int64, count)
+        # same than billable_seconds_us, the negative durations are 0
+        seconds = np.maximum(closed_at - opened_at, 0) // timestamps.SECOND
+        if self.max_pour_seconds is not None:
+            seconds = np.minimum(seconds, self.max_pour_seconds)
+        flows = np.fromiter(map(float, flow_volumes), dtype=np.float64, count=count)
+        flows = np.rint(flows * 10 ** FLOW_SCALE).astype(np.int64)
+
+        return self.merge(np.column_stack((dispensers, flows, seconds, np.ones(count, dtype=np.int64))))
+
+    def unique(self, columns):
+        """
+            np.unique of the rows of columns, the rows are packed in a single int64 when they fit
+            because sorting a 1d array is much faster than np.unique(axis=0)
+            :return: returns the unique rows and the inverse indexes
+        """
+        try:
+            packed = np.ravel_multi_index(columns.T, columns.max(axis=0) + 1) if len(columns) else None
+        except ValueError:
+            packed = None
+        if packed is None:
+            keys, inverse = np.unique(columns, axis=0, return_inverse=True)
+            return keys, inverse.reshape(-1)
+        packed, inverse = np.unique(packed, return_inverse=True)
+        return np.column_stack(np.unravel_index(packed, columns.max(axis=0) + 1)), inverse
+
+    def merge(self, combinations):
+        keys, inverse = self.unique(combinations[:, :3])
+        counts = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(counts, inverse, combinations[:, 3])
+        return np.column_stack((keys, counts))
+
+    def get_amounts(self, scenario):
+        """
+            :return: returns the array of the amount spent by dispenser in 1/1000 units
+        """
+        dispensers, flows, seconds, counts = self.combinations.T
+        flows = flows.copy()
+        for dispenser_id, flow_volume in scenario.flow_volumes.items():
+            if dispenser_id in self.indexes:
+                flows[dispensers == self.indexes[dispenser_id]] = int(Decimal(flow_volume).scaleb(FLOW_SCALE))
+
+        pairs, inverse = self.unique(np.column_stack((flows, seconds)))
+        costs = np.array([
+            int(usage_cost(scenario.price_by_liter, Decimal(int(flow)).scaleb(-FLOW_SCALE), int(second)).scaleb(3))
+            for flow, second in pairs
+        ], dtype=np.int64)
+
+        amounts = np.zeros(len(self.indexes), dtype=np.int64)
+        np.add.at(amounts, dispensers, costs[inverse] * counts)
+        return amounts
+
+    def simulate(self, baseline, scenarios):
+        """
+            :param baseline: the current scenario
+            :param scenarios: the alternative scenarios
+            :return: returns a dict by dispenser id with the amount of the baseline and the amount and
+            the delta of each scenario
+        """
+        current = self.get_amounts(baseline)
+        alternatives = [(scenario.name, self.get_amounts(scenario)) for scenario in scenarios]
+        result = {}
+        for dispenser_id, index in self.indexes.items():
+            result[dispenser_id] = {
+                'amount': Decimal(int(current[index])).scaleb(-3),
+                'scenarios': {
+                    name: {
+                        'amount': Decimal(int(amounts[index])).scaleb(-3),
+                        'delta': Decimal(int(amounts[index] - current[index])).scaleb(-3)
+                    }
+                    for name, amounts in alternatives
+                }
+            }
+        return result
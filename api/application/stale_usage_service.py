@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+
+from api.models import BeerTapDispenser, BeerTapDispenserHistory, DispenserUsageSketch
+from api.timestamps import SECOND, now_us
+
+
+class StaleUsageCloser:
+    """
+    Closes the usages open longer than max_pour_seconds, they are closed at
+    opened_at + max_pour_seconds so they are charged the same than total_spent() charges them
+    while they are open. Each batch is one UPDATE of the usages and one UPDATE of their dispensers,
+    and the usages are added to the usage sketches of their buckets in the same transaction
+    """
+
+    def __init__(self, max_pour_seconds, batch_size):
+        self.max_pour = timedelta(seconds=max_pour_seconds)
+        self.max_pour_us = max_pour_seconds * SECOND
+        self.batch_size = batch_size
+
+    def close(self):
+        """
+            Closes the stale usages in batches
+            :return: returns the number of usages closed
+        """
+        closed = 0
+        while True:
+            now = datetime.now()
+            with transaction.atomic():
+                stale = (
+                    BeerTapDispenserHistory.objects
+                    .filter(closed_at__isnull=True, opened_at_us__lt=now_us() - self.max_pour_us)
+                    .order_by()
+                    .values_list('dispenser_id', flat=True)[:self.batch_size]
+                )
+                # the dispensers are locked before their usages, in id order, like closed(), open()
+                # and FlowVolumeUpdater do, so the writers can't deadlock. A controller closing one of
+                # these usages at the same time waits and gets a conflict, closed() only closes the
+                # open usages
+                dispenser_ids = list(
+                    BeerTapDispenser.objects
+                    .select_for_update()
+                    .filter(id__in=set(stale))
+                    .order_by('id')
+                    .values_list('id', flat=True)
+                )
+                if not dispenser_ids:
+                    return closed
+
+                # read again under the lock, the usages closed meanwhile by a controller are skipped
+                batch = list(
+                    BeerTapDispenserHistory.objects
+                    .select_for_update(of=('self',))
+                    .filter(
+                        dispenser_id__in=dispenser_ids,
+                        closed_at__isnull=True,
+                        opened_at_us__lt=now_us() - self.max_pour_us
+                    )
+                    .order_by('id')
+                    .values_list('id', 'dispenser_id', 'opened_at_us', 'flow_volume')
+                )
+
+                # the auto-closed usages are not real pours, they stay out of the duration stats
+                BeerTapDispenserHistory.objects.filter(id__in=[usage_id for usage_id, _, _, _ in batch]).update(
+                    closed_at=F('opened_at') + self.max_pour,
+                    closed_at_us=F('opened_at_us') + self.max_pour_us,
+                    stats_processed=True
+                )
+                BeerTapDispenser.objects.filter(
+                    id__in={dispenser_id for _, dispenser_id, _, _ in batch},
+                    status=BeerTapDispenser.BeerTapDispenserStatus.OPEN
+                ).update(
+                    status=BeerTapDispenser.BeerTapDispenserStatus.CLOSED,
+                    version=F('version') + 1,
+                    updated_at=now
+                )
+                # they are charged MAX_POUR_SECONDS, the sketches count them like that
+                DispenserUsageSketch.objects.record(
+                    (dispenser_id, opened_at_us, opened_at_us + self.max_pour_us, flow_volume)
+                    for _, dispenser_id, opened_at_us, flow_volume in batch
+                )
+            closed += len(batch)
@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from api.models import BeerTapDispenser, BeerTapDispenserHistory, DispenserUsageSketch
+
+
+class UsageSketchBuilder:
+    """
+    Rebuilds the usage sketches from the history, for the usages closed before the sketches existed
+    or after changing USAGE_SKETCH_BUCKET_SECONDS. Each dispenser is rebuilt in a transaction that
+    locks its row, so the usages closed meanwhile wait and are added to the new sketches
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+    def rebuild(self, dispenser_ids=None):
+        """
+            :param dispenser_ids: dispensers to rebuild, all of them by default
+            :return: returns the number of dispensers and usages processed
+        """
+        dispensers = BeerTapDispenser.objects.order_by('id').values_list('id', flat=True)
+        if dispenser_ids is not None:
+            dispensers = dispensers.filter(id__in=dispenser_ids)
+
+        rebuilt = usages = 0
+        for dispenser_id in dispensers.iterator(chunk_size=self.chunk_size):
+            usages += self.rebuild_dispenser(dispenser_id)
+            rebuilt += 1
+        return rebuilt, usages
+
+    def rebuild_dispenser(self, dispenser_id):
+        with transaction.atomic():
+            # a status change of the dispenser waits for the new sketches
+            list(BeerTapDispenser.objects.select_for_update().filter(id=dispenser_id).values_list('id'))
+            rows = (
+                BeerTapDispenserHistory.objects
+                .filter(dispenser_id=dispenser_id, closed_at_us__isnull=False)
+                .order_by('opened_at_us')
+                .values_list('opened_at_us', 'closed_at_us', 'flow_volume')
+            )
+            pours = defaultdict(list)
+            for opened_at_us, closed_at_us, flow_volume in rows.iterator(chunk_size=self.chunk_size):
+                bucket_us = DispenserUsageSketch.objects.get_bucket(opened_at_us)
+                pours[bucket_us].append(DispenserUsageSketch.objects.get_pour(opened_at_us, closed_at_us, flow_volume))
+
+            sketches = []
+            for bucket_us, bucket_pours in pours.items():
+                sketch = DispenserUsageSketch(dispenser_id=dispenser_id, bucket_us=bucket_us)
+                sketch.add(bucket_pours)
+                sketches.append(sketch)
+            DispenserUsageSketch.objects.filter(dispenser_id=dispenser_id).delete()
+            DispenserUsageSketch.objects.bulk_create(sketches, batch_size=self.chunk_size)
+        return sum(len(bucket_pours) for bucket_pours in pours.values())
@@ -0,0 +1,175 @@
+import atexit
+import functools
+import json
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.http import Http404
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+class FileAuditSink:
+    """
+    Appends the records to a file as JSON lines, the file is opened for each batch so it can be
+    rotated without restarting the process
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        lines = ''.join(json.dumps(record, default=str, separators=(',', ':')) + '\n' for record in records)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as audit_file:
+            audit_file.write(lines)
+
+
+class NullAuditSink:
+    """
+    Discards the records, used when AUDIT_LOG_FILE is not set
+    """
+
+    def write(self, records):
+        pass
+
+
+class AuditLog:
+    """
+    Ring buffer of audit records flushed in batches by a background thread.
+    append() never blocks the request on I/O: when the buffer is full the oldest record is
+    overwritten and counted as dropped, the thread is woken up once batch_size records are
+    waiting and flushes every flush_interval seconds anyway
+    """
+
+    def __init__(self, sink, capacity, batch_size, flush_interval):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def append(self, record):
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(record)
+            self.recorded += 1
+            pending = len(self.buffer)
+            # started on the first record, and again in the workers forked after it
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='audit-log', daemon=True)
+                self.thread.start()
+        if pending >= self.batch_size:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+            Writes the buffered records to the sink in batches, a batch that fails is logged and
+            discarded so a broken sink can't fill the memory
+            :return: returns the number of records written
+        """
+        written = 0
+        while True:
+            with self.lock:
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+            if not batch:
+                return written
+            try:
+                self.sink.write(batch)
+            except Exception:
+                logger.exception('audit batch of %s records lost', len(batch))
+                with self.lock:
+                    self.failed += len(batch)
+            else:
+                written += len(batch)
+                with self.lock:
+                    self.flushed += len(batch)
+
+    def get_stats(self):
+        return {
+            'recorded': self.recorded,
+            'pending': len(self.buffer),
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'failed': self.failed
+        }
+
+
+audit_log = AuditLog(
+    sink=(
+        FileAuditSink(settings.AUDIT_LOG_FILE.format(hostname=socket.gethostname()))
+        if settings.AUDIT_LOG_FILE else NullAuditSink()
+    ),
+    capacity=settings.AUDIT_BUFFER_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL
+)
+atexit.register(audit_log.flush)
+
+client_ident = BaseThrottle()
+
+
+def get_payload(request):
+    try:
+        data = request.data
+    except Exception:
+        # the payload could not be parsed, the error is the outcome
+        return None
+    return data.dict() if hasattr(data, 'dict') else data
+
+
+def audited(func):
+    """
+        Decorator of the actions recorded in the audit log: the payload, the outcome and the latency
+        of each request, the requests rejected by the throttles never reach the action
+    """
+    @functools.wraps(func)
+    def wrapper(viewset, request, *args, **kwargs):
+        start = time.perf_counter()
+        status_code, outcome, error = 500, 'error', None
+        try:
+            response = func(viewset, request, *args, **kwargs)
+            status_code = response.status_code
+            outcome = 'replayed' if response.has_header('Idempotent-Replayed') else 'ok'
+            return response
+        except APIException as e:
+            status_code, outcome, error = e.status_code, 'rejected', e.get_codes()
+            raise
+        except Http404:
+            status_code, outcome, error = 404, 'rejected', 'not_found'
+            raise
+        finally:
+            audit_log.append({
+                'time': datetime.now(timezone.utc).isoformat(),
+                'action': func.__name__,
+                'dispenser': kwargs.get('pk'),
+                'venue': request.headers.get('X-Venue'),
+                'client': client_ident.get_ident(request),
+                'idempotency_key': request.headers.get('Idempotency-Key'),
+                'payload': get_payload(request),
+                'status_code': status_code,
+                'outcome': outcome,
+                'error': error,
+                'latency': round((time.perf_counter() - start) * 1000, 3)
+            })
+    return wrapper
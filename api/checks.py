@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+from api import renderers
+
+
+def check_json_backend(app_configs, **kwargs):
+    """
+        Warns when JSON_BACKEND asks for orjson but it is not installed, the renderer and the parser
+        would fall back to the stock rest_framework classes on every request
+    """
+    if getattr(settings, 'JSON_BACKEND', None) == 'orjson' and renderers.orjson is None:
+        return [Warning(
+            'JSON_BACKEND is orjson but orjson is not installed, the stock JSON classes are used',
+            hint='Install the dependencies with poetry install or set JSON_BACKEND=stdlib',
+            id='api.W001'
+        )]
+    return []
@@ -0,0 +1,151 @@
+"""
+Storage-agnostic rules of the dispensers: opening, closing and pricing.
+
+This module is pure python, BeerTapDispenser and BeerTapDispenserHistory apply these rules
+with the django models and DispenserEngine applies them over any DispenserRepository.
+"""
+from decimal import Decimal
+
+from api.timestamps import utc_now
+
+OPEN = 'open'
+CLOSED = 'closed'
+
+
+class DispenserConflictError(Exception):
+    """
+    The dispenser is already opened/closed
+    """
+
+
+class InvalidTimestampError(ValueError):
+    """
+    The dispenser is closed before it was opened
+    """
+
+
+class DispenserState:
+    __slots__ = ('id', 'flow_volume', 'status', 'version')
+
+    def __init__(self, id, flow_volume, status=CLOSED, version=0):
+        self.id = id
+        self.flow_volume = flow_volume
+        self.status = status
+        self.version = version
+
+
+class UsageState:
+    __slots__ = ('id', 'dispenser_id', 'opened_at', 'closed_at', 'flow_volume')
+
+    def __init__(self, id, dispenser_id, opened_at, flow_volume, closed_at=None):
+        self.id = id
+        self.dispenser_id = dispenser_id
+        self.opened_at = opened_at
+        self.closed_at = closed_at
+        self.flow_volume = flow_volume
+
+
+def ensure_can_open(status, has_open_usage):
+    """
+        :param status: current status of the dispenser
+        :param has_open_usage: callable telling if the dispenser has a usage not closed yet,
+        it is only called when the status is open
+    """
+    if status == OPEN and has_open_usage():
+        raise DispenserConflictError()
+
+
+def ensure_can_close(status, opened_at, timestamp):
+    """
+        :param status: current status of the dispenser
+        :param opened_at: when the last usage of the dispenser was opened
+        :param timestamp: when the dispenser is closed
+    """
+    if status == CLOSED:
+        raise DispenserConflictError()
+    if not timestamp > opened_at:
+        raise InvalidTimestampError('updated_at value must be greater than opened_at')
+
+
+def billable_seconds(opened_at, closed_at, now, max_pour_seconds=None):
+    """
+        Calculates the seconds of a usage that are charged, the open usages are counted until now
+        and no usage is charged more than max_pour_seconds
+    """
+    seconds = max(int(((closed_at or now) - opened_at).total_seconds()), 0)
+    if max_pour_seconds is not None:
+        seconds = min(seconds, max_pour_seconds)
+    return seconds
+
+
+def billable_seconds_us(opened_at_us, closed_at_us, now_us, max_pour_seconds=None):
+    """
+        Same than billable_seconds with the instants in microseconds since the epoch, the
+        microseconds are floored like int(timedelta.total_seconds()) truncates the positive durations
+    """
+    seconds = max((closed_at_us if closed_at_us is not None else now_us) - opened_at_us, 0) // 1000000
+    if max_pour_seconds is not None:
+        seconds = min(seconds, max_pour_seconds)
+    return seconds
+
+
+def usage_cost(price_by_liter, flow_volume, seconds):
+    """
+        :param price_by_liter: Decimal price of a liter
+        :param flow_volume: Decimal liters by second of the usage
+        :param seconds: billable seconds of the usage
+        :return: returns the cost of the usage rounded to 3 decimals
+    """
+    return round(price_by_liter * (flow_volume * seconds), 3)
+
+
+def total_cost(costs):
+    """
+        :return: returns the sum of the costs of the usages rounded to 3 decimals
+    """
+    return round(sum(costs), 3)
+
+
+class DispenserEngine:
+    """
+    Applies the dispenser rules over a DispenserRepository, the same rules than the django models
+    without any storage, so it can run simulations and property tests in memory
+    """
+
+    def __init__(self, repository, price_by_liter, max_pour_seconds=None, clock=utc_now):
+        self.repository = repository
+        self.price_by_liter = Decimal(price_by_liter)
+        self.max_pour_seconds = max_pour_seconds
+        self.clock = clock
+
+    def execute_operation(self, dispenser_id, status, timestamp):
+        if status == OPEN:
+            return self.open(dispenser_id, timestamp)
+        return self.closed(dispenser_id, timestamp)
+
+    def open(self, dispenser_id, timestamp):
+        dispenser = self.repository.get(dispenser_id)
+        ensure_can_open(dispenser.status, lambda: self.repository.get_open_usage(dispenser_id) is not None)
+
+        self.repository.set_status(dispenser, OPEN)
+        usage = UsageState(None, dispenser_id, timestamp, dispenser.flow_volume)
+        self.repository.add_usage(usage)
+        return usage
+
+    def closed(self, dispenser_id, timestamp):
+        dispenser = self.repository.get(dispenser_id)
+        usage = self.repository.get_last_usage(dispenser_id)
+        ensure_can_close(dispenser.status, usage.opened_at if usage else None, timestamp)
+
+        self.repository.set_status(dispenser, CLOSED)
+        usage.closed_at = timestamp
+        self.repository.close_usage(usage)
+        return usage
+
+    def usage_cost(self, usage, now=None):
+        seconds = billable_seconds(usage.opened_at, usage.closed_at, now or self.clock(), self.max_pour_seconds)
+        return usage_cost(self.price_by_liter, usage.flow_volume, seconds)
+
+    def total_spent(self, dispenser_id, now=None):
+        now = now or self.clock()
+        return total_cost(self.usage_cost(usage, now) for usage in self.repository.get_usages(dispenser_id))
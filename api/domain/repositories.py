@@ -0,0 +1,74 @@
+from itertools import count
+
+from api.domain.dispenser import DispenserState
+
+
+class DispenserRepository:
+    """
+    Storage used by DispenserEngine
+    """
+
+    def get(self, dispenser_id):
+        raise NotImplementedError
+
+    def set_status(self, dispenser, status):
+        raise NotImplementedError
+
+    def get_open_usage(self, dispenser_id):
+        raise NotImplementedError
+
+    def get_last_usage(self, dispenser_id):
+        raise NotImplementedError
+
+    def get_usages(self, dispenser_id):
+        raise NotImplementedError
+
+    def add_usage(self, usage):
+        raise NotImplementedError
+
+    def close_usage(self, usage):
+        raise NotImplementedError
+
+
+class InMemoryDispenserRepository(DispenserRepository):
+    """
+    Keeps the dispensers and their usages in dicts, for tests and simulations
+    """
+
+    def __init__(self):
+        self.dispensers = {}
+        self.usages = {}
+        self.open_usages = {}
+        self.ids = count(1)
+
+    def create(self, dispenser_id, flow_volume):
+        dispenser = DispenserState(dispenser_id, flow_volume)
+        self.dispensers[dispenser_id] = dispenser
+        self.usages[dispenser_id] = []
+        return dispenser
+
+    def get(self, dispenser_id):
+        return self.dispensers[dispenser_id]
+
+    def set_status(self, dispenser, status):
+        dispenser.status = status
+        dispenser.version += 1
+
+    def get_open_usage(self, dispenser_id):
+        return self.open_usages.get(dispenser_id)
+
+    def get_last_usage(self, dispenser_id):
+        usages = self.usages[dispenser_id]
+        return usages[-1] if usages else None
+
+    def get_usages(self, dispenser_id):
+        return self.usages[dispenser_id]
+
+    def add_usage(self, usage):
+        usage.id = next(self.ids)
+        self.usages[usage.dispenser_id].append(usage)
+        self.open_usages[usage.dispenser_id] = usage
+
+    def close_usage(self, usage):
+        if self.open_usages.get(usage.dispenser_id) is usage:
+            del self.open_usages[usage.dispenser_id]
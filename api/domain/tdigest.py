@@ -0,0 +1,115 @@
+import math
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning), a sketch of a distribution that answers quantiles with a small
+    relative error at the tails. The values are buffered and merged into at most about
+    compression centroids, two digests are merged by merging their centroids, so the digests
+    of several time buckets are combined without the values they were built from
+    """
+    __slots__ = ('compression', 'centroids', 'buffer', 'min', 'max')
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        # sorted [mean, weight] pairs
+        self.centroids = []
+        self.buffer = []
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return sum(weight for _, weight in self.centroids) + sum(weight for _, weight in self.buffer)
+
+    def add(self, value, weight=1):
+        self.buffer.append([value, weight])
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.buffer) >= self.compression * 5:
+            self.compress()
+
+    def merge(self, other):
+        """
+            Adds the centroids of other to this digest
+            :return: returns this digest
+        """
+        other.compress()
+        self.buffer.extend([mean, weight] for mean, weight in other.centroids)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress()
+        return self
+
+    def scale(self, q):
+        # k1 scale function, the centroids are smaller near the tails
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def compress(self):
+        if not self.buffer:
+            return
+        values = sorted(self.centroids + self.buffer)
+        total = sum(weight for _, weight in values)
+        centroids = [list(values[0])]
+        cumulative = 0
+        k_lower = self.scale(0)
+        for mean, weight in values[1:]:
+            current = centroids[-1]
+            if self.scale(min((cumulative + current[1] + weight) / total, 1)) - k_lower <= 1:
+                current[0] += (mean - current[0]) * weight / (current[1] + weight)
+                current[1] += weight
+            else:
+                cumulative += current[1]
+                k_lower = self.scale(cumulative / total)
+                centroids.append([mean, weight])
+        self.centroids = centroids
+        self.buffer = []
+
+    def quantile(self, q):
+        """
+            Interpolates the quantile between the centers of the centroids, the extremes are
+            interpolated from min and max
+            :param q: quantile between 0 and 1
+            :return: returns the estimated value or None if the digest is empty
+        """
+        self.compress()
+        if not self.centroids:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        total = sum(weight for _, weight in self.centroids)
+        target = q * total
+        first_mean, first_weight = self.centroids[0]
+        if target < first_weight / 2:
+            return self.min + (first_mean - self.min) * target / (first_weight / 2)
+
+        cumulative = 0
+        for (mean, weight), (next_mean, next_weight) in zip(self.centroids, self.centroids[1:]):
+            center = cumulative + weight / 2
+            next_center = cumulative + weight + next_weight / 2
+            if target < next_center:
+                return mean + (next_mean - mean) * (target - center) / (next_center - center)
+            cumulative += weight
+
+        last_mean, last_weight = self.centroids[-1]
+        return last_mean + (self.max - last_mean) * (target - (total - last_weight / 2)) / (last_weight / 2)
+
+    def to_dict(self):
+        self.compress()
+        return {
+            'compression': self.compression,
+            'centroids': self.centroids,
+            'min': self.min if self.centroids else None,
+            'max': self.max if self.centroids else None
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data['compression'])
+        digest.centroids = [list(centroid) for centroid in data['centroids']]
+        if digest.centroids:
+            digest.min, digest.max = data['min'], data['max']
+        return digest
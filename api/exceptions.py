@@ -1,5 +1,5 @@
 from rest_framework.exceptions import APIException
-from rest_framework.status import HTTP_409_CONFLICT
+from rest_framework.status import HTTP_409_CONFLICT, HTTP_422_UNPROCESSABLE_ENTITY
 
 
 class DispenserAlreadyOpenOrClosedException(APIException):
@@ -7,3 +7,8 @@ class DispenserAlreadyOpenOrClosedException(APIException):
     default_detail = 'Dispenser is already opened/closed'
     default_code = 'dispenser_conflict'
 
+
+class IdempotencyKeyMismatchException(APIException):
+    status_code = HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was already used by a different request'
+    default_code = 'idempotency_key_mismatch'
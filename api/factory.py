@@ -1,7 +1,16 @@
 import factory
 from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import BeerTapDispenser, BeerTapDispenserHistory
+from .models import BeerTapDispenser, BeerTapDispenserHistory, Venue
+
+
+class VenueFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Venue
+        django_get_or_create = ('code',)
+
+    code = factory.Sequence(lambda n: n + 1)
+    name = factory.Sequence(lambda n: f'Venue {n + 1}')
 
 
 class BeerTapDispenserFactory(factory.django.DjangoModelFactory):
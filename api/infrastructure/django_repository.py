@@ -0,0 +1,64 @@
+from django.db import transaction
+
+from api.domain.dispenser import DispenserConflictError, DispenserState, UsageState
+from api.domain.repositories import DispenserRepository
+from api.models import BeerTapDispenser, BeerTapDispenserHistory, DispenserUsageSketch
+from api.timestamps import to_epoch_us
+
+
+class DjangoDispenserRepository(DispenserRepository):
+    """
+    DispenserRepository over the django models, the writes are the same than the ones of
+    BeerTapDispenser.open/closed
+    """
+
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else BeerTapDispenser.objects.all()
+
+    def get(self, dispenser_id):
+        dispenser = self.queryset.values('id', 'flow_volume', 'status', 'version').get(pk=dispenser_id)
+        return DispenserState(**dispenser)
+
+    def set_status(self, dispenser, status):
+        instance = BeerTapDispenser(id=dispenser.id, status=dispenser.status, version=dispenser.version)
+        instance.set_status(status)
+        dispenser.status, dispenser.version = instance.status, instance.version
+
+    def to_usage(self, history):
+        return UsageState(history.id, history.dispenser_id, history.opened_at, history.flow_volume, history.closed_at)
+
+    def get_open_usage(self, dispenser_id):
+        history = BeerTapDispenserHistory.objects.filter(dispenser_id=dispenser_id, closed_at__isnull=True).last()
+        return self.to_usage(history) if history else None
+
+    def get_last_usage(self, dispenser_id):
+        history = BeerTapDispenserHistory.objects.filter(dispenser_id=dispenser_id).last()
+        return self.to_usage(history) if history else None
+
+    def get_usages(self, dispenser_id):
+        return [
+            UsageState(*row) for row in BeerTapDispenserHistory.objects.filter(dispenser_id=dispenser_id).values_list(
+                'id', 'dispenser_id', 'opened_at', 'flow_volume', 'closed_at'
+            )
+        ]
+
+    def add_usage(self, usage):
+        history = BeerTapDispenserHistory.objects.create(
+            dispenser_id=usage.dispenser_id,
+            opened_at=usage.opened_at,
+            flow_volume=usage.flow_volume
+        )
+        usage.id = history.id
+
+    def close_usage(self, usage):
+        closed_at_us = to_epoch_us(usage.closed_at)
+        with transaction.atomic():
+            closed = BeerTapDispenserHistory.objects.filter(pk=usage.id, closed_at__isnull=True).update(
+                closed_at=usage.closed_at,
+                closed_at_us=closed_at_us
+            )
+            if not closed:
+                raise DispenserConflictError()
+            DispenserUsageSketch.objects.record(
+                [(usage.dispenser_id, to_epoch_us(usage.opened_at), closed_at_us, usage.flow_volume)]
+            )
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import connection
+from django.views import View
+from rest_framework import status
+from django.http import JsonResponse
+
+from api.application.health_service import HealthService
+
+# shared by all the requests of the process, it keeps the cached readiness result
+health_service = HealthService(connection, interval=settings.HEALTH_CHECK_INTERVAL)
+
+
+class LivenessView(View):
+
+    def __init__(self, health_service=health_service):
+        self.service = health_service
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(self.service.liveness(), status=status.HTTP_200_OK)
+
+
+class ReadinessView(View):
+
+    def __init__(self, health_service=health_service):
+        self.service = health_service
+
+    def get(self, request, *args, **kwargs):
+        result, ready = self.service.readiness()
+        return JsonResponse(result, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
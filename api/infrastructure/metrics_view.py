@@ -0,0 +1,21 @@
+from django.views import View
+from rest_framework import status
+from django.http import JsonResponse
+
+from api.audit import audit_log
+from api.middleware import limiter
+from api.throttling import throttled_requests
+
+
+class MetricsView(View):
+
+    def __init__(self, concurrency_limiter=limiter, audit=audit_log):
+        self.limiter = concurrency_limiter
+        self.audit = audit
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({
+            'concurrency': self.limiter.get_stats(),
+            'throttled': dict(throttled_requests),
+            'audit': self.audit.get_stats()
+        }, status=status.HTTP_200_OK)
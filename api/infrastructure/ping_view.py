@@ -8,8 +8,8 @@ from api.application.ping_service import PingService
 
 class PingView(View):
 
-    def __init__(self, ping_service=PingService(connection)):
-        self.service = ping_service
+    def __init__(self, ping_service=None):
+        self.service = ping_service or PingService(connection)
 
     def get(self, request, *args, **kwargs):
         return JsonResponse(self.service.ping(), status=status.HTTP_200_OK)
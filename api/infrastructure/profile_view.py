@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse, Http404, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from rest_framework import status
+
+from api.profiling import profile_store
+
+
+class ProfileView(View):
+    """
+    Downloads a stored profile, it needs the 'X-Profile: <PROFILING_TOKEN>' header.
+    ?format=pstats downloads the raw cProfile stats, they are loaded with pstats.Stats
+    """
+
+    def __init__(self, store=profile_store):
+        self.store = store
+
+    def get(self, request, profile_id, *args, **kwargs):
+        token = request.headers.get('X-Profile')
+        if not (token and settings.PROFILING_TOKEN and constant_time_compare(token, settings.PROFILING_TOKEN)):
+            raise Http404('Profile not found')
+
+        if request.GET.get('format') == 'pstats':
+            content = self.store.get_pstats(profile_id)
+            if content is None:
+                raise Http404('Profile not found')
+            response = HttpResponse(content, content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="{profile_id}.prof"'
+            return response
+
+        data = self.store.get(profile_id)
+        if data is None:
+            raise Http404('Profile not found')
+        return JsonResponse(data, status=status.HTTP_200_OK)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.http import HttpResponse, Http404
+from django.views import View
+
+
+class SchemaFileView(View):
+    """
+    Serves the OpenAPI schema generated at build time, the file is read once per process
+    """
+    content = None
+
+    def get(self, request, *args, **kwargs):
+        if SchemaFileView.content is None:
+            try:
+                with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as schema_file:
+                    SchemaFileView.content = schema_file.read()
+            except FileNotFoundError:
+                raise Http404('OpenAPI schema not generated, run manage.py generate_swagger')
+        return HttpResponse(SchemaFileView.content, content_type='application/json')
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.application.stale_usage_service import StaleUsageCloser
+
+
+class Command(BaseCommand):
+    help = 'Closes the usages open longer than MAX_POUR_SECONDS, run it periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.STALE_USAGES_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if settings.MAX_POUR_SECONDS is None:
+            raise CommandError('MAX_POUR_SECONDS is not set, the usages are never stale')
+
+        closer = StaleUsageCloser(max_pour_seconds=settings.MAX_POUR_SECONDS, batch_size=options['batch_size'])
+        self.stdout.write(f'{closer.close()} stale usages closed')
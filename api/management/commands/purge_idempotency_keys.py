@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes the idempotency keys older than IDEMPOTENCY_KEY_TTL, run it periodically'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=IdempotencyKey.get_expiration()).delete()
+        self.stdout.write(f'{deleted} idempotency keys deleted')
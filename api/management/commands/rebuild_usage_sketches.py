@@ -0,0 +1,26 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.application.usage_sketch_service import UsageSketchBuilder
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the usage sketches of the stats endpoint from the history, run it after changing ' \
+           'USAGE_SKETCH_BUCKET_SECONDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dispenser', action='append', dest='dispensers', help='dispenser id, all by default')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        dispenser_ids = None
+        if options['dispensers']:
+            try:
+                dispenser_ids = [uuid.UUID(dispenser_id) for dispenser_id in options['dispensers']]
+            except ValueError as e:
+                raise CommandError(f'invalid dispenser id: {e}')
+
+        builder = UsageSketchBuilder(chunk_size=options['chunk_size'])
+        dispensers, usages = builder.rebuild(dispenser_ids)
+        self.stdout.write(f'{usages} usages of {dispensers} dispensers added to the usage sketches')
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.application.anomaly_service import UsageAnomalyScanner
+
+
+class Command(BaseCommand):
+    help = 'Updates the usage duration stats and flags the anomalous usages, run it periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ANOMALY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        scanner = UsageAnomalyScanner(
+            batch_size=options['batch_size'],
+            max_open_seconds=settings.ANOMALY_MAX_OPEN_SECONDS,
+            zscore=settings.ANOMALY_ZSCORE
+        )
+        result = scanner.scan()
+        self.stdout.write(
+            f"{result['processed']} usages processed, {result['outliers']} duration outliers, "
+            f"{result['open_too_long']} usages open too long"
+        )
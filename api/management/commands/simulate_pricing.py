@@ -0,0 +1,60 @@
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.application.pricing_simulator import PricingScenario, PricingSimulator, np
+
+
+class Command(BaseCommand):
+    help = 'Reports the amount spent by dispenser in the history with other prices and flow volumes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--price', type=Decimal, action='append', default=[],
+                            help='price by liter of a scenario, it can be repeated')
+        parser.add_argument('--flow', action='append', default=[], metavar='DISPENSER_ID=FLOW_VOLUME',
+                            help='flow volume of a dispenser in the scenarios, it can be repeated')
+        parser.add_argument('--chunk-size', type=int, default=settings.PRICING_SIMULATOR_CHUNK_SIZE)
+
+    def get_flow_volumes(self, values):
+        flow_volumes = {}
+        for value in values:
+            dispenser_id, _, flow_volume = value.partition('=')
+            try:
+                dispenser_id, flow_volume = uuid.UUID(dispenser_id), Decimal(flow_volume)
+            except (ValueError, InvalidOperation):
+                raise CommandError(f'invalid flow volume {value}')
+            if not 0 < flow_volume < 10 or flow_volume.as_tuple().exponent < -4:
+                raise CommandError(f'invalid flow volume {value}, it must be a number like 0.0653')
+            flow_volumes[dispenser_id] = flow_volume
+        return flow_volumes
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('numpy is not installed, install the dependencies with poetry install')
+
+        flow_volumes = self.get_flow_volumes(options['flow'])
+        prices = options['price'] or ([settings.PRICE_BY_LITER] if flow_volumes else [])
+        if not prices:
+            raise CommandError('add a --price or a --flow scenario')
+
+        baseline = PricingScenario('current', settings.PRICE_BY_LITER)
+        scenarios = [PricingScenario(f'price={price}', price, flow_volumes) for price in prices]
+
+        simulator = PricingSimulator(max_pour_seconds=settings.MAX_POUR_SECONDS, chunk_size=options['chunk_size'])
+        usages = simulator.load()
+        result = simulator.simulate(baseline, scenarios)
+
+        total = {scenario.name: 0 for scenario in scenarios}
+        current = 0
+        for dispenser_id, row in result.items():
+            current += row['amount']
+            columns = []
+            for name, value in row['scenarios'].items():
+                total[name] += value['amount']
+                columns.append(f"{name} {value['amount']} ({value['delta']:+})")
+            self.stdout.write(f"{dispenser_id} current {row['amount']} " + ' '.join(columns))
+
+        columns = [f'{name} {amount} ({amount - current:+})' for name, amount in total.items()]
+        self.stdout.write(f'{usages} usages, total current {current} ' + ' '.join(columns))
@@ -0,0 +1,154 @@
+import random
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+
+from api.profiling import Profile, current_profile, profile_store
+from api.routers import RoutingState, routing_state
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the requests served at the same time by the process, the requests waiting longer
+    than timeout are rejected instead of waiting for a database connection
+    """
+
+    def __init__(self, limit, timeout):
+        self.limit = limit
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.accepted = 0
+        self.shed = 0
+
+    def acquire(self):
+        if not self.semaphore.acquire(timeout=self.timeout):
+            with self.lock:
+                self.shed += 1
+            return False
+
+        with self.lock:
+            self.accepted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.semaphore.release()
+
+    def get_stats(self):
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'accepted': self.accepted,
+            'shed': self.shed
+        }
+
+
+limiter = ConcurrencyLimiter(limit=settings.CONCURRENCY_LIMIT, timeout=settings.CONCURRENCY_LIMIT_TIMEOUT)
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds the load with 503 when the process is serving CONCURRENCY_LIMIT requests, the health
+    endpoints are exempt so the probes keep working under load
+    """
+
+    def __init__(self, get_response, limiter=limiter):
+        self.get_response = get_response
+        self.limiter = limiter
+        self.exempt_paths = tuple(settings.CONCURRENCY_LIMIT_EXEMPT_PATHS)
+
+    def __call__(self, request):
+        if request.path.startswith(self.exempt_paths):
+            return self.get_response(request)
+
+        if not self.limiter.acquire():
+            response = JsonResponse(
+                {'detail': 'Service is overloaded, try again later'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.limiter.release()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Starts the routing state of each request, the clients that wrote recently carry a cookie
+    that pins their reads to the primary for REPLICA_PIN_SECONDS so they read their own writes
+    """
+    cookie_name = 'primary_pinned'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=self.cookie_name in request.COOKIES)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+
+        if state.wrote:
+            response.set_cookie(self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests with the X-Profile header set to PROFILING_TOKEN and a sample of
+    PROFILING_SAMPLE_RATE of the other requests, the stages of the views are timed with
+    api.profiling.span and the SQL queries of every database are recorded.
+    The profile is stored for PROFILING_TTL seconds, its id is returned in the X-Profile-Id header
+    """
+
+    def __init__(self, get_response, store=profile_store):
+        self.get_response = get_response
+        self.store = store
+
+    def should_profile(self, request):
+        token = request.headers.get('X-Profile')
+        if token and settings.PROFILING_TOKEN and constant_time_compare(token, settings.PROFILING_TOKEN):
+            return True
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profile = Profile(
+            method=request.method,
+            path=request.path,
+            max_queries=settings.PROFILING_MAX_QUERIES,
+            use_cprofile=settings.PROFILING_CPROFILE
+        )
+        token = current_profile.set(profile)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile.execute_wrapper))
+            profile.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.stop()
+                current_profile.reset(token)
+
+        self.store.save(profile, response.status_code, settings.PROFILING_TTL)
+        response['X-Profile-Id'] = profile.id
+        return response
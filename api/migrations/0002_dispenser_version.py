@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beertapdispenser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='beertapdispenser',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.13 on 2026-10-19 19:06
+
+import api.models
+from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+
+
+def create_default_venue(apps, schema_editor):
+    # the existing dispensers are moved to the default venue
+    Venue = apps.get_model('api', 'Venue')
+    Venue.objects.using(schema_editor.connection.alias).get_or_create(
+        code=settings.DEFAULT_VENUE_CODE,
+        defaults={'name': 'Default venue'}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Venue',
+            fields=[
+                ('code', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=128)),
+            ],
+            options={
+                'verbose_name': 'Venue',
+                'verbose_name_plural': 'Venues',
+            },
+        ),
+        migrations.RunPython(create_default_venue, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='beertapdispenser',
+            name='id',
+            field=models.UUIDField(default=None, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='beertapdispenserhistory',
+            index=models.Index(fields=['dispenser', 'id'], name='history_dispenser_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='beertapdispenser',
+            name='venue',
+            field=models.ForeignKey(default=api.models.get_default_venue_code, on_delete=django.db.models.deletion.PROTECT, related_name='dispensers', to='api.venue'),
+        ),
+    ]
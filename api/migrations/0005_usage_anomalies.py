@@ -0,0 +1,68 @@
+# Generated by Django 4.1.13 on 2026-10-19 19:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_venue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispenserUsageStats',
+            fields=[
+                ('dispenser', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage_stats', serialize=False, to='api.beertapdispenser')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Dispenser Usage Stats',
+                'verbose_name_plural': 'Dispenser Usage Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open_too_long', 'open too long'), ('duration_outlier', 'duration outlier')], max_length=16)),
+                ('duration', models.FloatField()),
+                ('zscore', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Usage Alert',
+                'verbose_name_plural': 'Usage Alerts',
+            },
+        ),
+        migrations.AddField(
+            model_name='beertapdispenserhistory',
+            name='stats_processed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='beertapdispenserhistory',
+            index=models.Index(condition=models.Q(('closed_at__isnull', True)), fields=['opened_at'], name='history_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beertapdispenserhistory',
+            index=models.Index(condition=models.Q(('stats_processed', False)), fields=['id'], name='history_unprocessed_idx'),
+        ),
+        migrations.AddField(
+            model_name='usagealert',
+            name='dispenser',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='api.beertapdispenser'),
+        ),
+        migrations.AddField(
+            model_name='usagealert',
+            name='usage',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='api.beertapdispenserhistory'),
+        ),
+        migrations.AddConstraint(
+            model_name='usagealert',
+            constraint=models.UniqueConstraint(fields=('usage', 'kind'), name='unique_usage_alert'),
+        ),
+    ]
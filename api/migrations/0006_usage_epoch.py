@@ -0,0 +1,53 @@
+# Generated by Django 4.1.13 on 2026-10-19 19:25
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+
+EPOCH = datetime(1970, 1, 1)
+BATCH_SIZE = 5000
+
+
+def to_epoch_us(value):
+    # same conversion than api.timestamps.to_epoch_us, the naive datetimes are UTC
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def backfill_epoch(apps, schema_editor):
+    BeerTapDispenserHistory = apps.get_model('api', 'BeerTapDispenserHistory')
+    usages = BeerTapDispenserHistory.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        batch = list(usages.filter(id__gt=last_id).order_by('id').only('id', 'opened_at', 'closed_at')[:BATCH_SIZE])
+        if not batch:
+            return
+        for usage in batch:
+            usage.opened_at_us = to_epoch_us(usage.opened_at)
+            usage.closed_at_us = to_epoch_us(usage.closed_at)
+        usages.bulk_update(batch, ['opened_at_us', 'closed_at_us'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_usage_anomalies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beertapdispenserhistory',
+            name='closed_at_us',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='beertapdispenserhistory',
+            name='opened_at_us',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_epoch, migrations.RunPython.noop),
+    ]
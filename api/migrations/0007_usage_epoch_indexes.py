@@ -0,0 +1,30 @@
+# Generated by Django 4.1.13 on 2026-10-19 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_usage_epoch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='beertapdispenserhistory',
+            name='opened_at_us',
+            field=models.BigIntegerField(editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='beertapdispenserhistory',
+            name='history_open_idx',
+        ),
+        migrations.AddIndex(
+            model_name='beertapdispenserhistory',
+            index=models.Index(fields=['dispenser', 'opened_at_us'], name='history_dispenser_opened_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beertapdispenserhistory',
+            index=models.Index(condition=models.Q(('closed_at__isnull', True)), fields=['opened_at_us'], name='history_open_us_idx'),
+        ),
+    ]
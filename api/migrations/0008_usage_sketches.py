@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-19 19:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_usage_epoch_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispenserUsageSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_us', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('seconds', models.PositiveBigIntegerField(default=0)),
+                ('liters', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('digest', models.JSONField(default=dict)),
+                ('dispenser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_sketches', to='api.beertapdispenser')),
+            ],
+            options={
+                'verbose_name': 'Dispenser Usage Sketch',
+                'verbose_name_plural': 'Dispenser Usage Sketches',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dispenserusagesketch',
+            constraint=models.UniqueConstraint(fields=('dispenser', 'bucket_us'), name='unique_usage_sketch_bucket'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.13 on 2026-10-19 20:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def set_venue(apps, schema_editor):
+    IdempotencyKey = apps.get_model('api', 'IdempotencyKey')
+    BeerTapDispenser = apps.get_model('api', 'BeerTapDispenser')
+    IdempotencyKey.objects.using(schema_editor.connection.alias).update(
+        venue_id=Subquery(BeerTapDispenser.objects.filter(pk=OuterRef('dispenser_id')).values('venue_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_usage_sketches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='venue',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='api.venue'),
+        ),
+        migrations.RunPython(set_venue, migrations.RunPython.noop),
+    ]
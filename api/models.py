@@ -1,11 +1,71 @@
+import hashlib
+import math
 import uuid
+from collections import defaultdict
 from decimal import Decimal
-from datetime import datetime
-from django.db import models
+from datetime import datetime, timedelta
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.conf import settings
+from django.utils.http import quote_etag
 from rest_framework.exceptions import ValidationError
 
-from api.exceptions import DispenserAlreadyOpenOrClosedException
+from api.ids import venue_uuid
+from api.timestamps import SECOND, to_epoch_us, now_us
+from api.profiling import span
+from api.domain import dispenser as rules
+from api.domain.tdigest import TDigest
+from api.exceptions import DispenserAlreadyOpenOrClosedException, IdempotencyKeyMismatchException
+
+
+def get_billable_seconds(opened_at, closed_at):
+    """
+        Calculates the seconds of a usage that are charged, the open usages are counted until now
+        and no usage is charged more than MAX_POUR_SECONDS.
+        The instants are compared as UTC microseconds since the epoch, so the durations are
+        right across the DST changes of TIME_ZONE
+        :param opened_at: when the usage was opened
+        :param closed_at: when the usage was closed, None if it is still open
+        :return: returns the difference in seconds
+    """
+    # difference between time now and opened_at if the usage is still open
+    return rules.billable_seconds_us(
+        to_epoch_us(opened_at), to_epoch_us(closed_at), now_us(), settings.MAX_POUR_SECONDS
+    )
+
+
+def get_pricing_fingerprint():
+    """
+        Short hash of the settings that change the amounts of the usages already closed, it is part
+        of the spending etag so a pricing change invalidates the cached responses
+        :return: returns the fingerprint
+    """
+    pricing = f'{settings.PRICE_BY_LITER}:{settings.MAX_POUR_SECONDS}'
+    return hashlib.sha1(pricing.encode()).hexdigest()[:8]
+
+
+def get_default_venue_code():
+    return settings.DEFAULT_VENUE_CODE
+
+
+class Venue(models.Model):
+    """
+    Venue (tenant) of the dispensers, the code is the prefix of the ids of its dispensers
+    so all the data of a venue is contiguous in the indexes and it could be moved to its own shard
+    """
+    code = models.PositiveSmallIntegerField(
+        primary_key=True
+    )
+    name = models.CharField(
+        max_length=128
+    )
+
+    class Meta:
+        verbose_name = 'Venue'
+        verbose_name_plural = 'Venues'
+
+    def __str__(self):
+        return self.name
 
 
 class BeerTapDispenser(models.Model):
@@ -13,10 +73,17 @@ class BeerTapDispenser(models.Model):
         OPEN = 'open', 'open'
         CLOSED = 'closed', 'closed'
 
+    # venue-prefixed and time-ordered, it is set by save() using venue_uuid
     id = models.UUIDField(
         primary_key=True,
         editable=False,
-        default=uuid.uuid4
+        default=None
+    )
+    venue = models.ForeignKey(
+        'api.Venue',
+        related_name='dispensers',
+        on_delete=models.PROTECT,
+        default=get_default_venue_code
     )
     flow_volume = models.DecimalField(
         max_digits=5,
@@ -28,11 +95,24 @@ class BeerTapDispenser(models.Model):
         default=BeerTapDispenserStatus.CLOSED,
         editable=False
     )
+    # incremented on every status change, it is the etag of the spending data
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'Beer Tap Dispenser'
         verbose_name_plural = 'Beer Tap Dispensers'
 
+    def save(self, *args, **kwargs):
+        if self.id is None:
+            self.id = venue_uuid(self.venue_id)
+        super().save(*args, **kwargs)
+
     def execute_operation(self, status, timestamp):
         """
             Execute the function open or closed of this class and send as parameter the timestamp to each function
@@ -49,7 +129,22 @@ class BeerTapDispenser(models.Model):
             :return: returns nothing
         """
         self.status = status
-        self.save(update_fields=['status'])
+        # incremented in the database, a concurrent status change (or the stale closer) can't
+        # produce the same version for a different payload
+        self.version = F('version') + 1
+        self.save(update_fields=['status', 'version', 'updated_at'])
+        # deferred, the new version is only read from the database if it is used
+        del self.version
+
+    def get_spending_validators(self):
+        """
+            Builds the http validators of the spending data of this BeerTapDispenser
+            :return: returns the etag (version and pricing fingerprint) and the last modified
+            timestamp, both are None while the dispenser is open because the amount grows every second
+        """
+        if self.status == self.get_open_choice():
+            return None, None
+        return quote_etag(f'{self.version}-{get_pricing_fingerprint()}'), int(self.updated_at.timestamp())
 
     def get_open_choice(self):
         return self.__class__.BeerTapDispenserStatus.OPEN
@@ -63,14 +158,26 @@ class BeerTapDispenser(models.Model):
             :param timestamp: this attribute contains when the BeerTapDispenser was opened
             :return: returns nothing
         """
-        if self.status == self.get_open_choice() and self.usages.filter(closed_at__isnull=True).exists():
-            raise DispenserAlreadyOpenOrClosedException()
-
-        self.set_status(status=self.get_open_choice())
-        self.usages.create(
-            opened_at=timestamp,
-            flow_volume=self.flow_volume
-        )
+        with transaction.atomic():
+            with span('lock'):
+                # the status and the flow volume are read from the locked row: a concurrent open
+                # waits and sees this one, a flow volume change committed before is copied by the
+                # new usage and one started after waits for the usage
+                self.flow_volume, self.status = BeerTapDispenser.objects.select_for_update().values_list(
+                    'flow_volume', 'status'
+                ).get(pk=self.pk)
+            try:
+                with span('exists'):
+                    rules.ensure_can_open(self.status, self.usages.filter(closed_at__isnull=True).exists)
+            except rules.DispenserConflictError:
+                raise DispenserAlreadyOpenOrClosedException()
+            with span('set_status'):
+                self.set_status(status=self.get_open_choice())
+            with span('usages.create'):
+                self.usages.create(
+                    opened_at=timestamp,
+                    flow_volume=self.flow_volume
+                )
 
     def closed(self, timestamp: str):
         """
@@ -78,22 +185,47 @@ class BeerTapDispenser(models.Model):
             :param timestamp: this attribute contains when the BeerTapDispenser was closed
             :return: returns nothing
         """
-        last_dispenser_history = self.usages.all().last()
-        if self.status == self.get_closed_choice():
+        with span('last_usage'):
+            last_dispenser_history = self.usages.all().last()
+        opened_at = last_dispenser_history.opened_at if last_dispenser_history else None
+        try:
+            rules.ensure_can_close(self.status, to_epoch_us(opened_at), to_epoch_us(timestamp))
+        except rules.DispenserConflictError:
             raise DispenserAlreadyOpenOrClosedException()
-        elif timestamp > last_dispenser_history.opened_at:
-            self.set_status(status=self.get_closed_choice())
-            last_dispenser_history.closed_at = timestamp
-            last_dispenser_history.save(update_fields=['closed_at'])
-        else:
-            raise ValidationError({'error': 'updated_at value must be greater than opened_at'})
+        except rules.InvalidTimestampError as e:
+            raise ValidationError({'error': str(e)})
+
+        with transaction.atomic():
+            with span('set_status'):
+                self.set_status(status=self.get_closed_choice())
+            with span('usage.save'):
+                last_dispenser_history.closed_at = timestamp
+                last_dispenser_history.set_epoch()
+                # only an open usage is closed, the usage loaded above could have been closed
+                # meanwhile by another request or by the stale usage closer
+                closed = BeerTapDispenserHistory.objects.filter(
+                    pk=last_dispenser_history.pk, closed_at__isnull=True
+                ).update(closed_at=last_dispenser_history.closed_at, closed_at_us=last_dispenser_history.closed_at_us)
+            if not closed:
+                raise DispenserAlreadyOpenOrClosedException()
+            with span('usage_sketch'):
+                DispenserUsageSketch.objects.record([last_dispenser_history.get_sketch_row()])
 
     def total_spent(self):
         """
             Calculates the total spent, sum all the usages
             :return: returns the total spent
         """
-        return round(sum(h.total_spent() for h in self.usages.all()), 3)
+        return rules.total_cost(h.total_spent() for h in self.usages.all())
+
+
+class BeerTapDispenserHistoryQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_epoch()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class BeerTapDispenserHistory(models.Model):
@@ -107,15 +239,56 @@ class BeerTapDispenserHistory(models.Model):
         blank=True,
         null=True
     )
+    # opened_at and closed_at as UTC microseconds since the epoch, set by save(), the durations
+    # are integer subtractions that the SQL aggregates and the range indexes can use
+    opened_at_us = models.BigIntegerField(
+        editable=False
+    )
+    closed_at_us = models.BigIntegerField(
+        blank=True,
+        null=True,
+        editable=False
+    )
     flow_volume = models.DecimalField(
         max_digits=5,
         decimal_places=4
     )
+    # set by the anomaly scanner once the closed usage is part of the duration stats
+    stats_processed = models.BooleanField(
+        default=False,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Beer Tap Dispenser History'
         verbose_name_plural = 'Beer Tap Dispensers History'
         ordering = ['id']
+        indexes = [
+            # the usages of a dispenser in order, the dispenser ids are venue-prefixed
+            # so this index keeps the history of each venue together
+            models.Index(fields=['dispenser', 'id'], name='history_dispenser_id_idx'),
+            # the usages of a dispenser in a time range
+            models.Index(fields=['dispenser', 'opened_at_us'], name='history_dispenser_opened_idx'),
+            # partial indexes of the anomaly scanner, they only contain the usages still open
+            # and the ones not processed yet, so the scans never read the whole history
+            models.Index(fields=['opened_at_us'], name='history_open_us_idx', condition=Q(closed_at__isnull=True)),
+            models.Index(fields=['id'], name='history_unprocessed_idx', condition=Q(stats_processed=False)),
+        ]
+
+    objects = BeerTapDispenserHistoryQuerySet.as_manager()
+
+    def set_epoch(self):
+        self.opened_at_us = to_epoch_us(self.opened_at)
+        self.closed_at_us = to_epoch_us(self.closed_at)
+
+    def save(self, *args, **kwargs):
+        self.set_epoch()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # the epoch columns are saved with their datetimes
+            epoch_fields = {'opened_at': 'opened_at_us', 'closed_at': 'closed_at_us'}
+            kwargs['update_fields'] = set(update_fields) | {epoch_fields[f] for f in update_fields if f in epoch_fields}
+        super().save(*args, **kwargs)
 
     def total_spent(self):
         """
@@ -123,19 +296,330 @@ class BeerTapDispenserHistory(models.Model):
             :return: returns the total spent
         """
         seconds = self.get_time_difference_in_seconds()
-        return round(Decimal(settings.PRICE_BY_LITER) * (self.flow_volume * seconds), 3)
+        return rules.usage_cost(Decimal(settings.PRICE_BY_LITER), self.flow_volume, seconds)
 
     def get_time_difference_in_seconds(self):
         """
             Calculates the total time between closed_at and opened_at
             :return: returns the difference in seconds
         """
-        if self.closed_at:
-            # difference between closed and opened at if both are not null
-            seconds = (self.closed_at - self.opened_at).seconds
-        else:
-            now = datetime.now()
-            # difference between time now because opened_at is None and  opened_at
-            seconds = (now - self.opened_at).seconds
-        return seconds
+        return get_billable_seconds(self.opened_at, self.closed_at)
 
+    def get_sketch_row(self):
+        return self.dispenser_id, self.opened_at_us, self.closed_at_us, self.flow_volume
+
+
+class IdempotencyKey(models.Model):
+    """
+    Result of a status request sent with an Idempotency-Key header, the retries of the request are
+    answered with this result instead of executing the operation again.
+    The keys are unique by venue, the controllers of different venues can send the same key
+    """
+    venue = models.ForeignKey(
+        'api.Venue',
+        related_name='idempotency_keys',
+        on_delete=models.CASCADE
+    )
+    key = models.CharField(
+        max_length=255
+    )
+    dispenser = models.ForeignKey(
+        'api.BeerTapDispenser',
+        related_name='idempotency_keys',
+        on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        max_length=8,
+        choices=BeerTapDispenser.BeerTapDispenserStatus.choices
+    )
+    updated_at = models.DateTimeField()
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            # its index is used by get_replay
+            models.UniqueConstraint(fields=['venue', 'key'], name='unique_venue_idempotency_key'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.venue_id is None:
+            # the key belongs to the venue of its dispenser
+            self.venue_id = self.dispenser.venue_id
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def get_expiration(cls):
+        """
+            Calculates the creation date before which the keys are expired
+            :return: returns the expiration datetime
+        """
+        return datetime.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+    @classmethod
+    def get_replay(cls, key, dispenser_id, status, venue_code):
+        """
+            Looks for the stored result of a key, the expired keys are deleted and ignored
+            :param key: value of the Idempotency-Key header
+            :param dispenser_id: id of the dispenser of the current request
+            :param status: status of the current request, it must be the same than the stored one
+            :param venue_code: venue of the current request, the keys of other venues are not visible
+            :return: returns the stored IdempotencyKey or None if the request was not executed yet
+        """
+        if len(key) > cls._meta.get_field('key').max_length:
+            raise ValidationError({'error': 'Idempotency-Key must have at most 255 characters'})
+
+        stored = cls.objects.filter(venue_id=venue_code, key=key).first()
+        if stored is None:
+            return None
+        if stored.created_at < cls.get_expiration():
+            stored.delete()
+            return None
+        try:
+            same_dispenser = stored.dispenser_id == uuid.UUID(str(dispenser_id))
+        except ValueError:
+            same_dispenser = False
+        if not same_dispenser or stored.status != status:
+            raise IdempotencyKeyMismatchException()
+        return stored
+
+
+class DispenserUsageStats(models.Model):
+    """
+    Running mean and variance of the usage durations of a dispenser (Welford's algorithm),
+    they are updated incrementally with the usages closed since the last scan
+    """
+    dispenser = models.OneToOneField(
+        'api.BeerTapDispenser',
+        related_name='usage_stats',
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    count = models.PositiveIntegerField(
+        default=0
+    )
+    mean = models.FloatField(
+        default=0
+    )
+    m2 = models.FloatField(
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Dispenser Usage Stats'
+        verbose_name_plural = 'Dispenser Usage Stats'
+
+    def add(self, duration):
+        """
+            Adds the duration of a usage to the running stats
+            :param duration: duration of the usage in seconds
+            :return: returns nothing
+        """
+        self.count += 1
+        delta = duration - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (duration - self.mean)
+
+    def get_std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def get_zscore(self, duration):
+        """
+            Calculates how many standard deviations the duration is far from the mean
+            :return: returns the z-score or None if there are not enough usages to tell
+        """
+        std = self.get_std()
+        if self.count < settings.ANOMALY_MIN_USAGES or std == 0:
+            return None
+        return (duration - self.mean) / std
+
+
+class UsageAlert(models.Model):
+    class UsageAlertKind(models.TextChoices):
+        OPEN_TOO_LONG = 'open_too_long', 'open too long'
+        DURATION_OUTLIER = 'duration_outlier', 'duration outlier'
+
+    dispenser = models.ForeignKey(
+        'api.BeerTapDispenser',
+        related_name='alerts',
+        on_delete=models.CASCADE
+    )
+    usage = models.ForeignKey(
+        'api.BeerTapDispenserHistory',
+        related_name='alerts',
+        on_delete=models.CASCADE
+    )
+    kind = models.CharField(
+        max_length=16,
+        choices=UsageAlertKind.choices
+    )
+    duration = models.FloatField()
+    zscore = models.FloatField(
+        blank=True,
+        null=True
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Usage Alert'
+        verbose_name_plural = 'Usage Alerts'
+        constraints = [
+            # a usage is flagged once by kind, the scans can run again without duplicating alerts
+            models.UniqueConstraint(fields=['usage', 'kind'], name='unique_usage_alert'),
+        ]
+
+
+class DispenserUsageSketchQuerySet(models.QuerySet):
+
+    def get_bucket(self, timestamp_us):
+        """
+            :return: returns the start of the bucket of an instant in microseconds since the epoch
+        """
+        size = settings.USAGE_SKETCH_BUCKET_SECONDS * SECOND
+        return timestamp_us - timestamp_us % size
+
+    def get_pour(self, opened_at_us, closed_at_us, flow_volume):
+        """
+            :return: returns the billable seconds and the flow volume of a closed usage
+        """
+        return rules.billable_seconds_us(opened_at_us, closed_at_us, closed_at_us, settings.MAX_POUR_SECONDS), flow_volume
+
+    def record(self, usages):
+        """
+            Adds closed usages to the sketches of their buckets, the sketches are locked in order
+            so the controllers closing usages of the same bucket wait for each other
+            :param usages: (dispenser id, opened_at_us, closed_at_us, flow_volume) of each usage
+            :return: returns nothing
+        """
+        pours = defaultdict(list)
+        for dispenser_id, opened_at_us, closed_at_us, flow_volume in usages:
+            pours[dispenser_id, self.get_bucket(opened_at_us)].append(
+                self.get_pour(opened_at_us, closed_at_us, flow_volume)
+            )
+        if not pours:
+            return
+
+        with transaction.atomic():
+            sketches = self.lock(pours)
+            missing = pours.keys() - sketches.keys()
+            if missing:
+                # created empty first, a concurrent close may be creating the same bucket
+                self.bulk_create(
+                    [DispenserUsageSketch(dispenser_id=dispenser_id, bucket_us=bucket_us)
+                     for dispenser_id, bucket_us in missing],
+                    ignore_conflicts=True
+                )
+                sketches = self.lock(pours)
+
+            for key, bucket_pours in pours.items():
+                sketches[key].add(bucket_pours)
+            self.bulk_update(sketches.values(), ['count', 'seconds', 'liters', 'digest'])
+
+    def lock(self, keys):
+        dispenser_ids = {dispenser_id for dispenser_id, _ in keys}
+        buckets = {bucket_us for _, bucket_us in keys}
+        sketches = (
+            self.select_for_update()
+            .filter(dispenser_id__in=dispenser_ids, bucket_us__in=buckets)
+            .order_by('dispenser_id', 'bucket_us')
+        )
+        return {
+            (sketch.dispenser_id, sketch.bucket_us): sketch
+            for sketch in sketches if (sketch.dispenser_id, sketch.bucket_us) in keys
+        }
+
+    def get_stats(self, dispenser_id, start_us=None, end_us=None):
+        """
+            Merges the sketches of the buckets of a dispenser in a window, the buckets are whole so
+            the window is widened to the buckets containing start and end
+            :param start_us: start of the window in microseconds since the epoch, None is unbounded
+            :param end_us: end of the window in microseconds since the epoch, None is unbounded
+            :return: returns the count, average and percentiles of the pour durations and the liters
+        """
+        sketches = self.filter(dispenser_id=dispenser_id)
+        if start_us is not None:
+            sketches = sketches.filter(bucket_us__gte=self.get_bucket(start_us))
+        if end_us is not None:
+            sketches = sketches.filter(bucket_us__lte=self.get_bucket(end_us))
+
+        digest = TDigest(settings.USAGE_SKETCH_COMPRESSION)
+        count = seconds = buckets = 0
+        liters = Decimal(0)
+        for sketch in sketches.order_by():
+            count += sketch.count
+            seconds += sketch.seconds
+            liters += sketch.liters
+            buckets += 1
+            digest.merge(sketch.get_digest())
+        return {
+            'count': count,
+            'average': seconds / count if count else None,
+            'p50': digest.quantile(0.5),
+            'p95': digest.quantile(0.95),
+            'liters': liters,
+            'buckets': buckets
+        }
+
+
+class DispenserUsageSketch(models.Model):
+    """
+    Pours of a dispenser opened in a time bucket: the count, the total billable seconds and liters
+    and a t-digest of the durations, they are updated when a usage is closed so the stats of any
+    window are merged from its buckets without reading the usages
+    """
+    dispenser = models.ForeignKey(
+        'api.BeerTapDispenser',
+        related_name='usage_sketches',
+        on_delete=models.CASCADE
+    )
+    # start of the bucket in microseconds since the epoch
+    bucket_us = models.BigIntegerField()
+    count = models.PositiveIntegerField(
+        default=0
+    )
+    seconds = models.PositiveBigIntegerField(
+        default=0
+    )
+    liters = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0
+    )
+    digest = models.JSONField(
+        default=dict
+    )
+
+    class Meta:
+        verbose_name = 'Dispenser Usage Sketch'
+        verbose_name_plural = 'Dispenser Usage Sketches'
+        constraints = [
+            # its index is used by the window queries of a dispenser
+            models.UniqueConstraint(fields=['dispenser', 'bucket_us'], name='unique_usage_sketch_bucket'),
+        ]
+
+    objects = DispenserUsageSketchQuerySet.as_manager()
+
+    def get_digest(self):
+        if not self.digest:
+            return TDigest(settings.USAGE_SKETCH_COMPRESSION)
+        return TDigest.from_dict(self.digest)
+
+    def add(self, pours):
+        """
+            Adds pours to the counters and the digest
+            :param pours: billable seconds and flow volume of each pour
+            :return: returns nothing
+        """
+        digest = self.get_digest()
+        for seconds, flow_volume in pours:
+            self.count += 1
+            self.seconds += seconds
+            self.liters += flow_volume * seconds
+            digest.add(seconds)
+        self.digest = digest.to_dict()
@@ -0,0 +1,151 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+# profile of the current request, None when the request is not profiled
+current_profile = ContextVar('current_profile', default=None)
+
+
+class Profile:
+    """
+    Span timings, SQL queries and optionally the cProfile stats of a profiled request
+    """
+
+    def __init__(self, method, path, max_queries, use_cprofile=False):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.max_queries = max_queries
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.stack = []
+        self.queries = []
+        self.dropped_queries = 0
+        self.profiler = cProfile.Profile() if use_cprofile else None
+
+    def elapsed_ms(self, since):
+        return round((time.perf_counter() - since) * 1000, 3)
+
+    def start(self):
+        if self.profiler is not None:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is running in this process (python >= 3.12 allows only one),
+                # the spans and the queries are still recorded
+                self.profiler = None
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.duration = self.elapsed_ms(self.started)
+
+    @contextmanager
+    def span(self, name):
+        self.stack.append(name)
+        path = '/'.join(self.stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({
+                'name': path,
+                'start': round((start - self.started) * 1000, 3),
+                'duration': self.elapsed_ms(start)
+            })
+            self.stack.pop()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """
+            Database execute wrapper, records the query with the span running it
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < self.max_queries:
+                self.queries.append({
+                    'sql': sql,
+                    'span': '/'.join(self.stack),
+                    'alias': context['connection'].alias,
+                    'duration': self.elapsed_ms(start)
+                })
+            else:
+                self.dropped_queries += 1
+
+    def get_stats(self, limit=30):
+        """
+            :return: returns the cProfile stats sorted by cumulative time as text and the raw
+            stats loadable by pstats, both are None without cProfile
+        """
+        if self.profiler is None:
+            return None, None
+        self.profiler.create_stats()
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue(), marshal.dumps(self.profiler.stats)
+
+    def to_dict(self, status_code, stats=None):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status_code': status_code,
+            'duration': self.duration,
+            'spans': self.spans,
+            'queries': self.queries,
+            'dropped_queries': self.dropped_queries,
+            'cprofile': stats
+        }
+
+
+@contextmanager
+def span(name):
+    """
+        Times a stage of the current request when it is profiled, otherwise it does nothing
+    """
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.span(name):
+        yield
+
+
+class ProfileStore:
+    """
+    Keeps the profiles in the django cache for ttl seconds so they can be downloaded
+    """
+    key_prefix = 'profile'
+
+    def __init__(self, cache=cache):
+        self.cache = cache
+
+    def get_key(self, profile_id, kind):
+        return f'{self.key_prefix}:{profile_id}:{kind}'
+
+    def save(self, profile, status_code, ttl):
+        stats, raw_stats = profile.get_stats()
+        data = profile.to_dict(status_code, stats)
+        values = {self.get_key(profile.id, 'json'): data}
+        if raw_stats is not None:
+            values[self.get_key(profile.id, 'pstats')] = raw_stats
+        self.cache.set_many(values, ttl)
+        return data
+
+    def get(self, profile_id):
+        return self.cache.get(self.get_key(profile_id, 'json'))
+
+    def get_pstats(self, profile_id):
+        return self.cache.get(self.get_key(profile_id, 'pstats'))
+
+
+profile_store = ProfileStore()
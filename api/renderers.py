@@ -0,0 +1,48 @@
+import decimal
+
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, Decimal values are written as numbers like the stock
+    JSONRenderer does with COERCE_DECIMAL_TO_STRING = False, datetimes and UUIDs are encoded
+    natively by orjson.
+    The stock renderer is used when orjson is not installed, when an indent is requested or when
+    the REST_FRAMEWORK settings ask for a format orjson can't produce (ascii or non compact json)
+    """
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+    encoder = encoders.JSONEncoder()
+
+    def default(self, obj):
+        """
+            Called by orjson for the types it does not know
+            :param obj: the object to encode
+            :return: returns a value orjson can encode
+        """
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        return self.encoder.default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # same escaping than JSONRenderer, the output must be a strict javascript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
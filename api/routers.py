@@ -0,0 +1,77 @@
+import contextvars
+import functools
+import random
+
+from django.conf import settings
+
+
+class RoutingState:
+    """
+    Routing decisions of the current request, read_only is set by the read-only actions and
+    pinned once the request (or a recent request of the same client) wrote to the primary.
+    The replica is chosen once, all the reads of the request see the same replication lag
+    """
+    __slots__ = ('read_only', 'pinned', 'wrote', 'replica')
+
+    def __init__(self, pinned=False):
+        self.read_only = False
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+routing_state = contextvars.ContextVar('routing_state', default=None)
+
+
+def get_routing_state():
+    state = routing_state.get()
+    if state is None:
+        state = RoutingState()
+        routing_state.set(state)
+    return state
+
+
+def read_from_replica(func):
+    """
+        Decorator of the read-only actions (spending, summaries, exports...), their queries are
+        sent to a replica unless the request is pinned to the primary
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        state = get_routing_state()
+        read_only, state.read_only = state.read_only, True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            state.read_only = read_only
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends the reads of the read-only actions to one of DATABASE_REPLICAS, everything else uses
+    the primary ('default'). After a write the reads of the request go to the primary too.
+    The replica is kept for the whole request, otherwise the etag (the version) and the usages
+    of a spending response could come from replicas with a different lag
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.read_only or state.pinned or not settings.DATABASE_REPLICAS:
+            return 'default'
+        if state.replica not in settings.DATABASE_REPLICAS:
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = get_routing_state()
+        state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas contain the same data than the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the schema through the replication
+        return db not in settings.DATABASE_REPLICAS
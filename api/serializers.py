@@ -1,5 +1,11 @@
+import decimal
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
-from .models import BeerTapDispenser, BeerTapDispenserHistory
+from rest_framework.exceptions import ValidationError
+
+from .models import BeerTapDispenser, BeerTapDispenserHistory, get_billable_seconds
+from .domain.dispenser import usage_cost, total_cost
 
 
 class BeerTapDispenserSerializer(serializers.ModelSerializer):
@@ -30,6 +36,73 @@ class DispenserStatusSerializer(serializers.Serializer):
         pass
 
 
+class FlowVolumeSerializer(serializers.Serializer):
+    """
+       Serializer for validate the new flow volume of a dispenser
+    """
+    id = serializers.UUIDField()
+    flow_volume = serializers.DecimalField(max_digits=5, decimal_places=4, min_value=0)
+
+
+class BulkFlowVolumeSerializer(serializers.Serializer):
+    """
+       Serializer for validate a batch of flow volume changes and how the open usages are handled
+    """
+    dispensers = FlowVolumeSerializer(many=True, allow_empty=False)
+    open_usages = serializers.ChoiceField(choices=('keep', 'reprice'), default='keep')
+
+    def validate_dispensers(self, value):
+        if len(value) > settings.FLOW_VOLUME_BATCH_SIZE:
+            raise ValidationError(f'at most {settings.FLOW_VOLUME_BATCH_SIZE} dispensers can be updated at once')
+        flow_volumes = {item['id']: item['flow_volume'] for item in value}
+        if len(flow_volumes) != len(value):
+            raise ValidationError('the dispensers must be unique')
+        return flow_volumes
+
+    def update(self, instance, validated_data):  # pragma: no cover
+        pass
+
+    def create(self, validated_data):  # pragma: no cover
+        pass
+
+
+class DispenserStatsQuerySerializer(serializers.Serializer):
+    """
+       Serializer for validate the window of the usage stats, both ends are optional
+    """
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise ValidationError({'error': 'start must be before end'})
+        return attrs
+
+    def update(self, instance, validated_data):  # pragma: no cover
+        pass
+
+    def create(self, validated_data):  # pragma: no cover
+        pass
+
+
+class DispenserStatsSerializer(serializers.Serializer):
+    """
+       Serializer for show the usage stats of a dispenser, the durations are billable seconds
+    """
+    count = serializers.IntegerField()
+    average = serializers.FloatField(allow_null=True)
+    p50 = serializers.FloatField(allow_null=True)
+    p95 = serializers.FloatField(allow_null=True)
+    liters = serializers.DecimalField(max_digits=16, decimal_places=4)
+    buckets = serializers.IntegerField()
+
+    def update(self, instance, validated_data):  # pragma: no cover
+        pass
+
+    def create(self, validated_data):  # pragma: no cover
+        pass
+
+
 class BeerTapDispenserHistorySerializer(serializers.ModelSerializer):
     """
        Serializer for show the usages
@@ -57,3 +130,98 @@ class SpendingDispenserSerializer(serializers.ModelSerializer):
             'amount',
             'usages'
         )
+
+
+class LeanDispenserStatusSerializer:
+    """
+       Lean version of DispenserStatusSerializer for the status endpoint, the valid payloads are
+       parsed directly and anything else is delegated to DispenserStatusSerializer so the
+       validated data and the errors are exactly the same
+    """
+    fallback_class = DispenserStatusSerializer
+    status_choices = {str(value): value for value, _ in BeerTapDispenser.BeerTapDispenserStatus.choices}
+    updated_at_field = DispenserStatusSerializer._declared_fields['updated_at']
+
+    def __init__(self, data):
+        self.initial_data = data
+        self.validated_data = None
+        self.errors = {}
+        self.fallback = None
+
+    def parse(self):
+        """
+            Parses the payload without going through the DRF field machinery
+            :return: returns the validated data or None if the fallback serializer must decide
+        """
+        data = self.initial_data
+        try:
+            status = self.status_choices.get(str(data['status']))
+            updated_at = data['updated_at']
+        except (KeyError, TypeError):
+            return None
+        if status is None or type(updated_at) is not str:
+            return None
+        try:
+            parsed = parse_datetime(updated_at)
+        except ValueError:
+            return None
+        if parsed is None:
+            return None
+        return {'status': status, 'updated_at': self.updated_at_field.enforce_timezone(parsed)}
+
+    def is_valid(self, raise_exception=False):
+        self.validated_data = self.parse()
+        if self.validated_data is None:
+            self.fallback = self.fallback_class(data=self.initial_data)
+            valid = self.fallback.is_valid()
+            self.validated_data = self.fallback.validated_data
+            self.errors = self.fallback.errors
+            if raise_exception and not valid:
+                raise ValidationError(self.errors)
+        return not self.errors
+
+    @property
+    def data(self):
+        if self.fallback is not None:
+            return self.fallback.data
+        return {
+            'status': self.validated_data['status'],
+            'updated_at': self.updated_at_field.to_representation(self.validated_data['updated_at'])
+        }
+
+
+class LeanSpendingDispenserSerializer:
+    """
+       Lean version of SpendingDispenserSerializer, the usages are read with a single values_list()
+       query and the amount is calculated from the same rows instead of calling total_spent()
+    """
+    usage_fields = ('opened_at', 'closed_at', 'flow_volume')
+    flow_volume_field = BeerTapDispenserHistorySerializer().fields['flow_volume']
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    @property
+    def data(self):
+        price = decimal.Decimal(settings.PRICE_BY_LITER)
+        quantum = decimal.Decimal('.1') ** self.flow_volume_field.decimal_places
+        context = decimal.getcontext().copy()
+        context.prec = self.flow_volume_field.max_digits
+        to_datetime = self.datetime_field.to_representation
+
+        usages = []
+        for opened_at, closed_at, flow_volume in self.instance.usages.values_list(*self.usage_fields):
+            # same maths than BeerTapDispenserHistory.total_spent
+            seconds = get_billable_seconds(opened_at, closed_at)
+            usages.append({
+                'opened_at': to_datetime(opened_at),
+                'closed_at': to_datetime(closed_at),
+                'flow_volume': flow_volume.quantize(quantum, context=context),
+                'total_spent': usage_cost(price, flow_volume, seconds)
+            })
+
+        return {
+            'amount': total_cost(usage['total_spent'] for usage in usages),
+            'usages': usages
+        }
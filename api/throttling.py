@@ -0,0 +1,125 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import SimpleRateThrottle
+
+# throttled requests by scope since the process started, exposed on api/metrics
+throttled_requests = Counter()
+
+
+class LocalTokenBuckets:
+    """
+    Token buckets of a cache local to the process (locmem), the read and the write of a bucket
+    are done under a lock so the concurrent requests of the process can't take the same token
+    """
+    lock = threading.Lock()
+
+    def take(self, cache, key, capacity, duration, now):
+        """
+            Refills the bucket and takes a token if there is one
+            :return: returns if the token was taken and the tokens left
+        """
+        with self.lock:
+            tokens, timestamp = cache.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - timestamp) * capacity / duration)
+            if tokens < 1:
+                return False, tokens
+            tokens -= 1
+            cache.set(key, (tokens, now), duration)
+            return True, tokens
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets of a redis cache shared by several processes, the bucket is a hash updated by a
+    lua script so the refill and the take are a single atomic operation on the server
+    """
+    script = """
+        local capacity = tonumber(ARGV[1])
+        local duration = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+        local tokens = tonumber(bucket[1]) or capacity
+        local timestamp = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(now - timestamp, 0) * capacity / duration)
+        if tokens < 1 then
+            return {0, tostring(tokens)}
+        end
+        tokens = tokens - 1
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'timestamp', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(duration * 1000))
+        return {1, tostring(tokens)}
+    """
+
+    def take(self, cache, key, capacity, duration, now):
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        allowed, tokens = client.eval(self.script, 1, key, capacity, duration, repr(now))
+        return bool(allowed), float(tokens)
+
+
+local_buckets = LocalTokenBuckets()
+redis_buckets = RedisTokenBuckets()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket version of SimpleRateThrottle, the rate 'number/period' allows bursts of
+    number requests and refills number tokens per period.
+    The bucket is stored in the django cache as (tokens, timestamp) and expires when it would be
+    full again, so the idle clients don't use any space. The take is atomic: under a process lock
+    with the local caches and with a lua script with redis
+    """
+
+    def get_buckets(self):
+        return redis_buckets if isinstance(self.cache, RedisCache) else local_buckets
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        allowed, self.tokens = self.get_buckets().take(
+            self.cache, self.key, self.num_requests, self.duration, self.now
+        )
+        if not allowed:
+            throttled_requests[self.scope] += 1
+        return allowed
+
+    def wait(self):
+        """
+            Seconds until the bucket has one token again
+        """
+        return max(1 - self.tokens, 0) * self.duration / self.num_requests
+
+
+class DispenserStatusThrottle(TokenBucketThrottle):
+    """
+    Limits the status changes of each dispenser, whoever sends them
+    """
+    scope = 'dispenser_status'
+
+    def get_cache_key(self, request, view):
+        pk = view.kwargs.get('pk')
+        try:
+            # the same dispenser has the same bucket whatever the case or the hyphens of its id
+            pk = uuid.UUID(str(pk))
+        except ValueError:
+            pass
+        return self.cache_format % {'scope': self.scope, 'ident': pk}
+
+
+class ClientStatusThrottle(TokenBucketThrottle):
+    """
+    Limits the status changes sent by each client (tap controller), whatever the dispenser is
+    """
+    scope = 'client_status'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
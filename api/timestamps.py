@@ -0,0 +1,41 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# microseconds in a second, the durations are stored in microseconds
+SECOND = 1000000
+
+
+def to_epoch_us(value):
+    """
+        Converts a usage instant to microseconds since the unix epoch.
+        USE_TZ is off, so rest_framework stores the aware timestamps of the requests as naive UTC
+        datetimes, the naive datetimes are UTC
+        :param value: naive (UTC) or aware datetime, None is returned as None
+        :return: returns the microseconds since the epoch
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(value):
+    """
+        :return: returns the naive UTC datetime of microseconds since the epoch
+    """
+    return EPOCH + timedelta(microseconds=value)
+
+
+def now_us():
+    return time.time_ns() // 1000
+
+
+def utc_now():
+    """
+        :return: returns now as a naive UTC datetime, comparable with the usage instants
+        (datetime.now() is the local time of TIME_ZONE)
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
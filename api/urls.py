@@ -1,6 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 from api.infrastructure.ping_view import PingView
+from api.infrastructure.health_views import LivenessView, ReadinessView
+from api.infrastructure.metrics_view import MetricsView
+from api.infrastructure.profile_view import ProfileView
 from .viewsets import BeerTapDispenserViewSet
 
 app_name = 'api'
@@ -10,5 +13,9 @@ router.register(r'dispenser', BeerTapDispenserViewSet)
 
 urlpatterns = [
     path('ping', PingView.as_view()),
+    path('health/live', LivenessView.as_view(), name='health-live'),
+    path('health/ready', ReadinessView.as_view(), name='health-ready'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('profiles/<str:profile_id>', ProfileView.as_view(), name='profile'),
     path('', include(router.urls))
 ]
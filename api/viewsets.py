@@ -1,9 +1,32 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import viewsets, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
-from .models import BeerTapDispenser
-from .serializers import BeerTapDispenserSerializer, DispenserStatusSerializer, SpendingDispenserSerializer
+from .application.flow_volume_service import FlowVolumeUpdater
+from .audit import audited
+from .exceptions import DispenserAlreadyOpenOrClosedException, IdempotencyKeyMismatchException
+from .ids import MAX_VENUE_CODE
+from .models import BeerTapDispenser, DispenserUsageSketch, IdempotencyKey, Venue
+from .profiling import span
+from .routers import read_from_replica
+from .throttling import DispenserStatusThrottle, ClientStatusThrottle
+from .timestamps import to_epoch_us
+from .serializers import (
+    BeerTapDispenserSerializer,
+    DispenserStatusSerializer,
+    SpendingDispenserSerializer,
+    BulkFlowVolumeSerializer,
+    DispenserStatsQuerySerializer,
+    DispenserStatsSerializer,
+    LeanDispenserStatusSerializer,
+    LeanSpendingDispenserSerializer
+)
 
 
 class BeerTapDispenserViewSet(mixins.CreateModelMixin,
@@ -17,15 +40,41 @@ class BeerTapDispenserViewSet(mixins.CreateModelMixin,
         [json]: id, flow_volume
     You can see the full json request/response example going to 'http://localhost:4500'
     in swagger documentation.
+    Every request is scoped to the venue of the 'X-Venue' header (venue code), DEFAULT_VENUE_CODE
+    is used when it is not sent.
     """
     serializer_class = BeerTapDispenserSerializer
     queryset = BeerTapDispenser.objects.all()
 
+    def get_venue_code(self):
+        """
+            Reads the venue code of the request, the dispensers have the venue code as foreign key
+            so the queries are scoped without reading the venue
+            :return: returns the venue code
+        """
+        code = self.request.headers.get('X-Venue', settings.DEFAULT_VENUE_CODE)
+        try:
+            code = int(code)
+        except ValueError:
+            raise NotFound('Venue not found')
+        if not 0 <= code <= MAX_VENUE_CODE:
+            raise NotFound('Venue not found')
+        return code
+
+    def get_queryset(self):
+        return super().get_queryset().filter(venue_id=self.get_venue_code())
+
+    def perform_create(self, serializer):
+        venue = get_object_or_404(Venue, code=self.get_venue_code())
+        serializer.save(venue=venue)
+
     @action(
         detail=True,
         methods=['PUT'],
-        serializer_class=DispenserStatusSerializer
+        serializer_class=DispenserStatusSerializer,
+        throttle_classes=[DispenserStatusThrottle, ClientStatusThrottle]
     )
+    @audited
     def status(self, request, pk=None):
         """
         API endpoint action for update the status of a beer tap dispenser.
@@ -34,21 +83,98 @@ class BeerTapDispenserViewSet(mixins.CreateModelMixin,
         args (PUT method):
         'status' -> str: 'open' (status must be open or closed)
         'updated_at' -> str: '2022-11-17T20:21:31.082Z' (update_at must be timestamp)
+        The requests are throttled per dispenser and per client (429 with Retry-After),
+        the payload, outcome and latency of the requests are recorded in the audit log.
+        headers:
+        'Idempotency-Key' -> str: optional, the retries with the same key return the first result
+        without changing the dispenser again
         Returns:
         [json]: status, updated_at
         """
-        serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid(raise_exception=True):
-            timestamp = serializer.validated_data.get('updated_at')
-            status = serializer.validated_data.get('status')
-            self.get_object().execute_operation(timestamp=timestamp, status=status)
-        return Response(serializer.data)
+        # the lean serializer returns the same data than DispenserStatusSerializer,
+        # serializer_class is kept for the swagger documentation
+        with span('validation'):
+            serializer = LeanDispenserStatusSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+        timestamp = serializer.validated_data.get('updated_at')
+        status = serializer.validated_data.get('status')
+
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            with span('get_object'):
+                beer_tap_dispenser = self.get_object()
+            with span('execute_operation'):
+                beer_tap_dispenser.execute_operation(timestamp=timestamp, status=status)
+            return Response(serializer.data)
+
+        venue_code = self.get_venue_code()
+        with span('idempotency_replay'):
+            replay = IdempotencyKey.get_replay(
+                key=idempotency_key, dispenser_id=pk, status=status, venue_code=venue_code
+            )
+        if replay is None:
+            with span('get_object'):
+                beer_tap_dispenser = self.get_object()
+            try:
+                with span('execute_operation'), transaction.atomic():
+                    beer_tap_dispenser.execute_operation(timestamp=timestamp, status=status)
+                    IdempotencyKey.objects.create(
+                        venue_id=venue_code,
+                        key=idempotency_key,
+                        dispenser=beer_tap_dispenser,
+                        status=status,
+                        updated_at=timestamp
+                    )
+                return Response(serializer.data)
+            except (IntegrityError, DispenserAlreadyOpenOrClosedException) as e:
+                # a concurrent retry changed the dispenser first, this operation was rolled back
+                replay = IdempotencyKey.get_replay(
+                    key=idempotency_key, dispenser_id=pk, status=status, venue_code=venue_code
+                )
+                if replay is None and isinstance(e, IntegrityError):
+                    # the conflicting key of this venue expired and was purged meanwhile
+                    raise IdempotencyKeyMismatchException()
+                if replay is None:
+                    raise
+
+        data = {
+            'status': replay.status,
+            'updated_at': serializer.updated_at_field.to_representation(replay.updated_at)
+        }
+        return Response(data, headers={'Idempotent-Replayed': 'true'})
+
+    @action(
+        detail=False,
+        methods=['PATCH'],
+        url_path='flow-volume',
+        serializer_class=BulkFlowVolumeSerializer
+    )
+    def flow_volume(self, request):
+        """
+        API endpoint action for changing the flow volume of many beer tap dispensers at once.
+        args (PATCH method):
+        'dispensers' -> list: [{'id': 'd2a72ba4-7301-476e-bbb7-47de9b5cbf1e', 'flow_volume': 0.0653}]
+        'open_usages' -> str: 'keep' (the open usages keep the flow volume they were opened with)
+        or 'reprice' (the open usages are charged with the new flow volume)
+        The dispensers are updated in one transaction, the closed usages never change.
+        Returns:
+        [json]: updated, repriced_usages
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = FlowVolumeUpdater().update(
+            venue_code=self.get_venue_code(),
+            flow_volumes=serializer.validated_data['dispensers'],
+            open_usages=serializer.validated_data['open_usages']
+        )
+        return Response(result)
 
     @action(
         detail=True,
         methods=['GET'],
         serializer_class=SpendingDispenserSerializer
     )
+    @read_from_replica
     def spending(self, request, pk=None):
         """
         API endpoint action for getting all of spending data related to a beer tap dispenser.
@@ -58,8 +184,56 @@ class BeerTapDispenserViewSet(mixins.CreateModelMixin,
         'id' -> uuid: 'd2a72ba4-7301-476e-bbb7-47de9b5cbf1e' (this is the uuid for filtering)
         Returns:
         [json]: amount, usages
+        The response contains the ETag and Last-Modified headers while the dispenser is closed,
+        If-None-Match/If-Modified-Since requests are answered with 304 without calculating the usages.
         """
-        beer_tap_dispenser = self.get_object()
-        serializer = self.serializer_class(beer_tap_dispenser)
-        return Response(serializer.data)
+        with span('get_object'):
+            beer_tap_dispenser = self.get_object()
+        etag, last_modified = beer_tap_dispenser.get_spending_validators()
+
+        if etag is None:
+            # the dispenser is open, the amount changes every second
+            with span('serialize'):
+                response = Response(LeanSpendingDispenserSerializer(beer_tap_dispenser).data)
+            patch_cache_control(response, max_age=settings.SPENDING_OPEN_MAX_AGE)
+            return response
 
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            with span('serialize'):
+                response = Response(LeanSpendingDispenserSerializer(beer_tap_dispenser).data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    @action(
+        detail=True,
+        methods=['GET'],
+        serializer_class=DispenserStatsSerializer
+    )
+    @read_from_replica
+    def stats(self, request, pk=None):
+        """
+        API endpoint action for getting the usage stats of a beer tap dispenser in a window.
+        args (GET method):
+        'start' -> str: '2022-11-17T20:00:00Z' (optional query param, start of the window)
+        'end' -> str: '2022-11-18T04:00:00Z' (optional query param, end of the window)
+        Returns:
+        [json]: count, average, p50, p95 (pour durations in seconds), liters, buckets
+        The stats are merged from the usage sketches of the buckets in the window, so the window is
+        widened to whole USAGE_SKETCH_BUCKET_SECONDS buckets and the percentiles are estimates.
+        The usages are counted by opening time once they are closed.
+        """
+        query = DispenserStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        with span('get_object'):
+            beer_tap_dispenser = self.get_object()
+        with span('merge_sketches'):
+            stats = DispenserUsageSketch.objects.get_stats(
+                beer_tap_dispenser.id,
+                start_us=to_epoch_us(query.validated_data.get('start')),
+                end_us=to_epoch_us(query.validated_data.get('end'))
+            )
+        with span('serialize'):
+            return Response(DispenserStatsSerializer(stats).data)
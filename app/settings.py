@@ -22,13 +22,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-sc9a6(e05r6)i0c&%hbzpq048rr)-$0puq97*#&)!+g1d4b6t1'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     '127.0.0.1',
     '0.0.0.0',
     'localhost'
 ]
+# extra comma separated hosts, like the load balancer of the scale profile
+ALLOWED_HOSTS += list(filter(None, os.environ.get('ALLOWED_HOSTS', '').split(',')))
 
 # Application definition
 
@@ -43,18 +45,71 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ConcurrencyLimitMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware'
 ]
 
+# the orjson renderer and parser are used by default, set JSON_BACKEND=stdlib to use the
+# stock rest_framework classes instead. orjson is a dependency, the check api.W001 warns
+# when it is missing and the stock classes are used anyway
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson')
+
+JSON_BACKENDS = {
+    'orjson': ('api.renderers.FastJSONRenderer', 'api.parsers.FastJSONParser'),
+    'stdlib': ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        JSON_BACKENDS[JSON_BACKEND][0],
     ),
-    'COERCE_DECIMAL_TO_STRING': False
+    'DEFAULT_PARSER_CLASSES': (
+        JSON_BACKENDS[JSON_BACKEND][1],
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser'
+    ),
+    'COERCE_DECIMAL_TO_STRING': False,
+    # token buckets of the status endpoint, 'number/period' allows bursts of number requests
+    'DEFAULT_THROTTLE_RATES': {
+        'dispenser_status': os.environ.get('DISPENSER_STATUS_THROTTLE_RATE', '30/min'),
+        'client_status': os.environ.get('CLIENT_STATUS_THROTTLE_RATE', '50/s'),
+    },
+    # proxies in front of the api (load balancer), the clients are identified by X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
 }
 
+# requests served at the same time by each process, keep it under the database connections
+# available to the process, the requests waiting more than the timeout (seconds) get a 503
+CONCURRENCY_LIMIT = int(os.environ.get('CONCURRENCY_LIMIT', 32))
+CONCURRENCY_LIMIT_TIMEOUT = 0.05
+CONCURRENCY_LIMIT_EXEMPT_PATHS = ('/api/health/', '/api/metrics')
+
+# opt-in profiling, the requests with the 'X-Profile: <PROFILING_TOKEN>' header and a sample of
+# PROFILING_SAMPLE_RATE (0 to 1) of the requests are profiled, the profiles are kept in the cache
+# PROFILING_TTL seconds and downloaded from /api/profiles/<id> with the same header
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_CPROFILE = True
+PROFILING_MAX_QUERIES = 200
+PROFILING_TTL = 60 * 60
+
+# the throttling buckets and the profiles are stored here, they are shared by all the
+# api replicas when REDIS_URL is set (the redis package must be installed)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -82,17 +137,96 @@ DATABASES = {
         'NAME': os.environ.get('POSTGRES_DB'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
+        # persistent connections, checked before being reused
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # seconds to wait for a connection, the readiness probes fail fast when the database hangs
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('POSTGRES_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# read replicas, POSTGRES_REPLICA_HOSTS is a comma separated list of hosts with the same
+# credentials than the primary, the read-only actions are routed to them by PrimaryReplicaRouter
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{index}'] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+
+# seconds the reads of a client are pinned to the primary after it wrote
+REPLICA_PIN_SECONDS = 5
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# swagger schema, 'make schema' writes it to OPENAPI_SCHEMA_FILE for the API-only profile
+SWAGGER_SETTINGS = {
+    'DEFAULT_INFO': 'app.urls.api_info',
+}
+
+OPENAPI_SCHEMA_FILE = os.path.join(BASE_DIR, 'openapi.json')
+
+# venue of the requests without the X-Venue header
+DEFAULT_VENUE_CODE = 0
+
 # change this value if you wish to update the price by liter
 PRICE_BY_LITER = 12.25
 
+# seconds the spending data of an open dispenser can be cached by the clients
+SPENDING_OPEN_MAX_AGE = 1
+
+# seconds an Idempotency-Key of the status endpoint is kept
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# seconds the result of the readiness check is cached
+HEALTH_CHECK_INTERVAL = 2
+
+# a usage is never charged more than MAX_POUR_SECONDS, the usages open longer are closed by
+# manage.py close_stale_usages at opened_at + MAX_POUR_SECONDS. It is disabled (None) unless it
+# is set: enabling it changes the amount of the existing usages longer than the cap, the spending
+# etags include it so the cached responses are revalidated
+MAX_POUR_SECONDS = int(os.environ['MAX_POUR_SECONDS']) if os.environ.get('MAX_POUR_SECONDS') else None
+STALE_USAGES_BATCH_SIZE = 1000
+
+# anomaly scanner (manage.py scan_usage_anomalies), the usages open longer than
+# ANOMALY_MAX_OPEN_SECONDS or ANOMALY_ZSCORE standard deviations far from the mean duration
+# of their dispenser are flagged, the z-score is used once a dispenser has ANOMALY_MIN_USAGES
+ANOMALY_BATCH_SIZE = 1000
+ANOMALY_MAX_OPEN_SECONDS = 60 * 10
+ANOMALY_ZSCORE = 3
+ANOMALY_MIN_USAGES = 10
+
+# the usage stats of a dispenser are kept by USAGE_SKETCH_BUCKET_SECONDS buckets of the opening time,
+# each bucket has the counters and a t-digest of the pour durations with USAGE_SKETCH_COMPRESSION
+# (more centroids are more precise and bigger), the stats of a window merge its buckets.
+# Changing the bucket size needs manage.py rebuild_usage_sketches
+USAGE_SKETCH_BUCKET_SECONDS = 60 * 60
+USAGE_SKETCH_COMPRESSION = 100
+
+# audit log of the status requests, the records are buffered in memory (AUDIT_BUFFER_SIZE records,
+# the oldest are dropped when it is full) and appended to AUDIT_LOG_FILE as JSON lines in batches
+# of AUDIT_BATCH_SIZE at least every AUDIT_FLUSH_INTERVAL seconds, they are discarded without file.
+# {hostname} is replaced by the host name, so the replicas sharing a volume write different files
+AUDIT_LOG_FILE = os.environ.get('AUDIT_LOG_FILE')
+AUDIT_BUFFER_SIZE = 10000
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 1.0
+
+# dispensers updated by a request of the bulk flow volume endpoint
+FLOW_VOLUME_BATCH_SIZE = 1000
+
+# pricing simulator (manage.py simulate_pricing), usages read by server-side cursor fetch
+PRICING_SIMULATOR_CHUNK_SIZE = 100000
+
 # timezone
 TIME_ZONE = 'Europe/Lisbon'
+# the datetimes are naive UTC (DRF converts the aware input), the epoch columns of the usages
+# (api.timestamps.to_epoch_us and the 0006 backfill) and so the billing depend on it, it is set
+# explicitly because the default of Django 5 is True
+USE_TZ = False
@@ -0,0 +1,32 @@
+"""
+API-only settings profile, used by the workers that only serve the JSON API.
+
+It skips swagger, sessions, auth and staticfiles so the workers boot faster,
+select it with DJANGO_SETTINGS_MODULE=app.settings_api
+"""
+from app.settings import *  # noqa: F401,F403
+from app.settings import REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    'api',
+    'rest_framework',
+]
+
+MIDDLEWARE = [
+    'api.middleware.ConcurrencyLimitMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+TEMPLATES = []
+
+# without django.contrib.auth there are no users, every request is anonymous
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_AUTHENTICATION_CLASSES=[],
+    DEFAULT_PERMISSION_CLASSES=['rest_framework.permissions.AllowAny'],
+    UNAUTHENTICATED_USER=None,
+)
@@ -3,14 +3,17 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 
+# also used by 'manage.py generate_swagger' through SWAGGER_SETTINGS['DEFAULT_INFO']
+api_info = openapi.Info(
+    title="Dispenser Api",
+    default_version='v1',
+    description="Project build by osw4l",
+    contact=openapi.Contact(email="ioswxd@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Dispenser Api",
-        default_version='v1',
-        description="Project build by osw4l",
-        contact=openapi.Contact(email="ioswxd@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
     permission_classes=[permissions.AllowAny],
 )
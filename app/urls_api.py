@@ -0,0 +1,14 @@
+"""
+URL configuration of the API-only profile (app.settings_api).
+
+drf_yasg is not imported, the OpenAPI schema generated at build time with
+'make schema' is served from OPENAPI_SCHEMA_FILE instead.
+"""
+from django.urls import path, include
+
+from api.infrastructure.schema_view import SchemaFileView
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path('openapi.json', SchemaFileView.as_view(), name='schema-json'),
+]
@@ -0,0 +1,41 @@
+"""
+Throughput of the in-memory dispenser engine, simulated pours (open + close) per second.
+
+Usage: python -m benchmarks.engine
+"""
+from benchmarks.utils import best_of
+
+
+def main(dispensers=1000, pours=100):
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+
+    from api.domain.dispenser import DispenserEngine
+    from api.domain.repositories import InMemoryDispenserRepository
+
+    start = datetime(2022, 1, 1, 20)
+    timestamps = [(start + timedelta(seconds=60 * i), start + timedelta(seconds=60 * i + 5)) for i in range(pours)]
+
+    def simulate():
+        repository = InMemoryDispenserRepository()
+        engine = DispenserEngine(repository, 12.25, max_pour_seconds=900)
+        for dispenser_id in range(dispensers):
+            repository.create(dispenser_id, Decimal('0.0653'))
+        for opened_at, closed_at in timestamps:
+            for dispenser_id in range(dispensers):
+                engine.open(dispenser_id, opened_at)
+                engine.closed(dispenser_id, closed_at)
+        return engine
+
+    seconds = best_of(simulate, number=1, repeat=3)
+    total = dispensers * pours
+    print(f'{total} pours in {seconds:.3f}s, {total / seconds:,.0f} pours/s')
+
+    engine = simulate()
+    seconds = best_of(lambda: [engine.total_spent(dispenser_id) for dispenser_id in range(dispensers)], number=1, repeat=3)
+    print(f'pricing {total} usages in {seconds:.3f}s, {total / seconds:,.0f} usages/s')
+
+
+if __name__ == '__main__':
+    # the engine is pure python, django is not configured
+    main()
@@ -0,0 +1,203 @@
+"""
+HTTP load test of the status endpoint, it only needs the standard library so it runs in the api
+image against any deployment. Each worker thread keeps a keep-alive connection and drives its own
+dispensers, so the usages of a dispenser are always sent in order.
+
+Without --replay each dispenser pours (open then close) with increasing timestamps, with --replay
+the status requests of an audit log (AUDIT_LOG_FILE) are sent again in the same order, the
+dispensers of the log are mapped to new dispensers created for the run.
+
+Usage: python -m benchmarks.load [--url URL] [--workers N] [--dispensers N] [--duration S]
+                                 [--replay audit.jsonl] [--venue CODE]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+STATUS_PATH = '/api/dispenser/{}/status/'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class Client:
+    """
+    Keep-alive JSON client of the api, it reconnects when the server closes the connection
+    """
+
+    def __init__(self, url, venue=None, timeout=10):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        if venue:
+            self.headers['X-Venue'] = venue
+        self.connection = None
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=self.headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+    def create_dispenser(self, flow_volume):
+        status, body = self.request('POST', '/api/dispenser/', {'flow_volume': flow_volume})
+        if status != 201:
+            raise RuntimeError(f'the dispenser was not created: {status} {body[:200]!r}')
+        return json.loads(body)['id']
+
+
+def synthetic_requests(dispensers, pours, start):
+    """
+        :return: returns a dict by dispenser of the status payloads of pours open/close cycles
+    """
+    requests = {}
+    for index, dispenser in enumerate(dispensers):
+        opened_at = start + timedelta(seconds=index)
+        payloads = []
+        for _ in range(pours):
+            closed_at = opened_at + timedelta(seconds=5)
+            payloads.append({'status': 'open', 'updated_at': opened_at.strftime(TIMESTAMP_FORMAT)})
+            payloads.append({'status': 'closed', 'updated_at': closed_at.strftime(TIMESTAMP_FORMAT)})
+            opened_at = closed_at + timedelta(seconds=55)
+        requests[dispenser] = payloads
+    return requests
+
+
+def read_audit_log(path):
+    """
+        :return: returns a dict by dispenser of the audit log with the status payloads in order,
+        the requests without a valid payload are skipped
+    """
+    requests = defaultdict(list)
+    with open(path, encoding='utf-8') as audit_file:
+        for line in audit_file:
+            record = json.loads(line)
+            payload = record.get('payload')
+            if record.get('action') != 'status' or not record.get('dispenser') or not isinstance(payload, dict):
+                continue
+            requests[record['dispenser']].append(payload)
+    return requests
+
+
+def percentile(values, fraction):
+    """
+        :return: returns the percentile of the sorted values in milliseconds
+    """
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+
+class LoadTest:
+    """
+    Sends the status requests of each dispenser with a pool of worker threads until they are all
+    sent or the duration is over, then reports the throughput, the latencies and the status codes
+    """
+
+    def __init__(self, url, workers, venue=None, duration=None):
+        self.url = url
+        self.workers = workers
+        self.venue = venue
+        self.duration = duration
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.lock = threading.Lock()
+
+    def prepare(self, requests):
+        """
+            Creates a new dispenser for each dispenser of requests
+            :return: returns the requests by new dispenser id
+        """
+        client = Client(self.url, self.venue)
+        flow_volumes = itertools.cycle(('0.0653', '0.1', '0.075', '0.05'))
+        return {client.create_dispenser(next(flow_volumes)): payloads for payloads in requests.values()}
+
+    def run_worker(self, batches, deadline):
+        client = Client(self.url, self.venue)
+        latencies = []
+        statuses = Counter()
+        errors = Counter()
+        for dispenser, payloads in batches:
+            path = STATUS_PATH.format(dispenser)
+            for payload in payloads:
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                start = time.perf_counter()
+                try:
+                    status, _ = client.request('PUT', path, payload)
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.statuses.update(statuses)
+            self.errors.update(errors)
+
+    def run(self, requests):
+        batches = [[] for _ in range(self.workers)]
+        for index, item in enumerate(requests.items()):
+            batches[index % self.workers].append(item)
+
+        start = time.monotonic()
+        deadline = start + self.duration if self.duration else None
+        threads = [threading.Thread(target=self.run_worker, args=(batch, deadline)) for batch in batches if batch]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'seconds': round(elapsed, 3),
+            'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'errors': dict(self.errors)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the status endpoint')
+    parser.add_argument('--url', default='http://localhost:5050')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--dispensers', type=int, default=256, help='dispensers of the synthetic load')
+    parser.add_argument('--pours', type=int, default=20, help='pours by dispenser of the synthetic load')
+    parser.add_argument('--duration', type=float, default=None, help='stops after these seconds')
+    parser.add_argument('--replay', default=None, help='audit log to replay instead of the synthetic load')
+    parser.add_argument('--venue', default=None)
+    options = parser.parse_args()
+
+    load_test = LoadTest(options.url, options.workers, options.venue, options.duration)
+    if options.replay:
+        requests = read_audit_log(options.replay)
+    else:
+        requests = synthetic_requests(range(options.dispensers), options.pours, datetime(2022, 1, 1, 20))
+    requests = load_test.prepare(requests)
+    print(json.dumps(dict(load_test.run(requests), workers=options.workers, dispensers=len(requests))))
+
+
+if __name__ == '__main__':
+    main()
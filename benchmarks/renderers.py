@@ -0,0 +1,44 @@
+"""
+Benchmark of FastJSONRenderer against the stock JSONRenderer over a spending response.
+
+Usage: python -m benchmarks.renderers
+"""
+from benchmarks.utils import setup, test_database, best_of, report
+
+
+def main(usages=10000):
+    from datetime import datetime, timedelta
+    from rest_framework.renderers import JSONRenderer
+
+    from api.factory import BeerTapDispenserFactory
+    from api.models import BeerTapDispenserHistory
+    from api.renderers import FastJSONRenderer
+    from api.serializers import LeanSpendingDispenserSerializer
+
+    dispenser = BeerTapDispenserFactory()
+    opened_at = datetime(2022, 1, 1, 20)
+    BeerTapDispenserHistory.objects.bulk_create(
+        BeerTapDispenserHistory(
+            dispenser=dispenser,
+            opened_at=opened_at + timedelta(minutes=i),
+            closed_at=opened_at + timedelta(minutes=i, seconds=5 + i % 50),
+            flow_volume=dispenser.flow_volume
+        )
+        for i in range(usages)
+    )
+    data = LeanSpendingDispenserSerializer(dispenser).data
+
+    assert JSONRenderer().render(data) == FastJSONRenderer().render(data)
+    print('output is byte-identical')
+
+    report(
+        f'spending render ({usages} usages)',
+        best_of(lambda: JSONRenderer().render(data), number=10),
+        best_of(lambda: FastJSONRenderer().render(data), number=10)
+    )
+
+
+if __name__ == '__main__':
+    setup()
+    with test_database():
+        main()
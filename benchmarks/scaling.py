@@ -0,0 +1,133 @@
+"""
+Scale-out benchmark, runs the load test against 1, 2, 4 and 8 api replicas of the scale profile
+(docker-compose.scale.yml: replicas behind nginx with a shared redis cache) and plots the
+throughput. It runs on the host with docker compose, everything else runs in the containers so
+no network access is needed once the images are built.
+
+The results are written to scaling.json and plotted in scaling.svg and in the terminal.
+
+Usage: python -m benchmarks.scaling [--replicas 1 2 4 8] [--replay audit.jsonl] [load test options...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+COMPOSE = ['docker', 'compose', '-f', 'docker-compose.scale.yml']
+LB_URL = 'http://lb:8080'
+
+
+def compose(*args, capture=False):
+    result = subprocess.run(COMPOSE + list(args), check=True, text=True, stdout=subprocess.PIPE if capture else None)
+    return result.stdout
+
+
+def wait_ready(timeout=120):
+    """
+        Waits until the load balancer answers the readiness check of a replica
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        probe = subprocess.run(
+            COMPOSE + ['run', '--rm', '--no-deps', 'loadtest', 'python', '-c',
+                       f'import urllib.request; urllib.request.urlopen("{LB_URL}/api/health/ready", timeout=2)'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if probe.returncode == 0:
+            return
+        time.sleep(2)
+    raise RuntimeError('the load balancer is not ready')
+
+
+def run_step(replicas, load_args):
+    compose('up', '-d', '--scale', f'api={replicas}', 'api')
+    # nginx resolves the replicas when it starts
+    compose('up', '-d', '--force-recreate', '--no-deps', 'lb')
+    wait_ready()
+    output = compose('run', '--rm', '--no-deps', 'loadtest', 'python', '-m', 'benchmarks.load',
+                     '--url', LB_URL, *load_args, capture=True)
+    return dict(json.loads(output.strip().splitlines()[-1]), replicas=replicas)
+
+
+def plot_text(results, width=50):
+    peak = max(result['throughput'] for result in results) or 1
+    for result in results:
+        bar = '#' * round(result['throughput'] / peak * width)
+        print(f"{result['replicas']:>3} replicas {bar:<{width}} {result['throughput']:>10,.1f} req/s  "
+              f"p99 {result['p99']}ms")
+
+
+def polyline(points):
+    return ' '.join(f'{x:.1f},{y:.1f}' for x, y in points)
+
+
+def plot_svg(results, path, width=640, height=360, margin=50):
+    """
+        Line chart of the throughput by replicas, plain SVG so no plotting library is needed
+    """
+    peak = max(result['throughput'] for result in results) or 1
+    replicas = [result['replicas'] for result in results]
+    step = (width - 2 * margin) / max(len(results) - 1, 1)
+    points = [
+        (margin + index * step, height - margin - result['throughput'] / peak * (height - 2 * margin))
+        for index, result in enumerate(results)
+    ]
+    # ideal linear scaling from the first step
+    base = results[0]['throughput'] / replicas[0]
+    ideal = [
+        (x, max(margin, height - margin - base * count / peak * (height - 2 * margin)))
+        for (x, _), count in zip(points, replicas)
+    ]
+    elements = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" '
+        f'font-size="12">',
+        f'<text x="{width / 2}" y="20" text-anchor="middle">status throughput by api replicas</text>',
+        f'<line x1="{margin}" y1="{height - margin}" x2="{width - margin}" y2="{height - margin}" stroke="black"/>',
+        f'<line x1="{margin}" y1="{margin}" x2="{margin}" y2="{height - margin}" stroke="black"/>',
+        f'<polyline points="{polyline(ideal)}" fill="none" stroke="gray" stroke-dasharray="4"/>',
+        f'<polyline points="{polyline(points)}" fill="none" stroke="steelblue" stroke-width="2"/>',
+    ]
+    for (x, y), result in zip(points, results):
+        elements.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3" fill="steelblue"/>')
+        elements.append(f'<text x="{x:.1f}" y="{y - 8:.1f}" text-anchor="middle">{result["throughput"]:,.0f}</text>')
+        elements.append(f'<text x="{x:.1f}" y="{height - margin + 16}" text-anchor="middle">{result["replicas"]}</text>')
+    elements.append(f'<text x="{width / 2}" y="{height - 10}" text-anchor="middle">replicas (dashed: linear)</text>')
+    elements.append(f'<text x="14" y="{height / 2}" transform="rotate(-90 14 {height / 2})" '
+                    f'text-anchor="middle">requests/s</text>')
+    elements.append('</svg>')
+    with open(path, 'w', encoding='utf-8') as svg_file:
+        svg_file.write('\n'.join(elements) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of the scale profile by api replicas')
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--output', default='scaling')
+    parser.add_argument('--keep', action='store_true', help='keeps the containers running at the end')
+    options, load_args = parser.parse_known_args()
+
+    if not os.path.exists('docker-compose.scale.yml'):
+        sys.exit('run it from the repository root')
+
+    compose('up', '-d', 'postgres', 'redis')
+    compose('run', '--rm', 'migrate')
+    results = []
+    try:
+        for replicas in options.replicas:
+            result = run_step(replicas, load_args)
+            print(json.dumps(result))
+            results.append(result)
+    finally:
+        if not options.keep:
+            compose('down')
+
+    with open(f'{options.output}.json', 'w', encoding='utf-8') as json_file:
+        json.dump(results, json_file, indent=2)
+    plot_svg(results, f'{options.output}.svg')
+    plot_text(results)
+
+
+if __name__ == '__main__':
+    main()
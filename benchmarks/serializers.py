@@ -0,0 +1,66 @@
+"""
+Microbenchmark of the lean serializers against the DRF serializers they replace.
+
+Usage: python -m benchmarks.serializers
+"""
+from benchmarks.utils import setup, test_database, best_of, report
+
+
+def main(usages=1000):
+    from datetime import datetime, timedelta
+    from rest_framework.renderers import JSONRenderer
+
+    from api.factory import BeerTapDispenserFactory
+    from api.models import BeerTapDispenserHistory
+    from api.serializers import (
+        DispenserStatusSerializer,
+        LeanDispenserStatusSerializer,
+        SpendingDispenserSerializer,
+        LeanSpendingDispenserSerializer
+    )
+
+    renderer = JSONRenderer()
+    dispenser = BeerTapDispenserFactory()
+    opened_at = datetime(2022, 1, 1, 20)
+    BeerTapDispenserHistory.objects.bulk_create(
+        BeerTapDispenserHistory(
+            dispenser=dispenser,
+            opened_at=opened_at + timedelta(minutes=i),
+            closed_at=opened_at + timedelta(minutes=i, seconds=5 + i % 50),
+            flow_volume=dispenser.flow_volume
+        )
+        for i in range(usages)
+    )
+
+    payload = {'status': 'open', 'updated_at': '2022-11-17T20:21:31.082Z'}
+
+    def validate(serializer_class):
+        serializer = serializer_class(data=payload)
+        serializer.is_valid(raise_exception=True)
+        return serializer.data
+
+    def spending(serializer_class):
+        return renderer.render(serializer_class(dispenser).data)
+
+    # the output must be byte-identical before comparing timings
+    assert renderer.render(validate(DispenserStatusSerializer)) == \
+        renderer.render(validate(LeanDispenserStatusSerializer))
+    assert spending(SpendingDispenserSerializer) == spending(LeanSpendingDispenserSerializer)
+    print('output is byte-identical')
+
+    report(
+        'status validation',
+        best_of(lambda: validate(DispenserStatusSerializer), number=2000),
+        best_of(lambda: validate(LeanDispenserStatusSerializer), number=2000)
+    )
+    report(
+        f'spending ({usages} usages)',
+        best_of(lambda: spending(SpendingDispenserSerializer), number=5),
+        best_of(lambda: spending(LeanSpendingDispenserSerializer), number=5)
+    )
+
+
+if __name__ == '__main__':
+    setup()
+    with test_database():
+        main()
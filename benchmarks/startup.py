@@ -0,0 +1,51 @@
+"""
+Startup benchmark of the settings profiles, each run is a fresh interpreter that measures the
+django setup plus the WSGI application import and the time to answer the first request.
+
+Usage: python -m benchmarks.startup [settings modules...]
+"""
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+PROFILES = ('app.settings', 'app.settings_api')
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+imported = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': '/api/health/live', 'REQUEST_METHOD': 'GET'}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+first_request = time.perf_counter()
+assert statuses[0].startswith('200'), statuses[0]
+print(json.dumps({'import': imported - start, 'first_request': first_request - start}))
+"""
+
+
+def measure(settings_module, runs=5):
+    results = []
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return median(r['import'] for r in results), median(r['first_request'] for r in results)
+
+
+def main(profiles=PROFILES):
+    for settings_module in profiles:
+        imported, first_request = measure(settings_module)
+        print(f'{settings_module:<28} import {imported * 1000:>8.1f}ms  first request {first_request * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or PROFILES)
@@ -0,0 +1,45 @@
+import os
+import timeit
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """
+        Configures django for the benchmarks, they run with the same settings than manage.py
+        :return: returns nothing
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+        Creates a throwaway test database like manage.py test does and destroys it at the end,
+        so the benchmarks never touch the real data
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def best_of(func, number, repeat=5):
+    """
+        Runs func number times, repeat times and takes the best round
+        :return: returns the best time per call in seconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(name, baseline, optimised):
+    print(f'{name:<28} baseline {baseline * 1e6:>10.1f}us  optimised {optimised * 1e6:>10.1f}us  '
+          f'speedup {baseline / optimised:>5.1f}x')
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from api.application.anomaly_service import UsageAnomalyScanner
+from api.factory import BeerTapDispenserFactory
+from api.models import BeerTapDispenserHistory, DispenserUsageStats, UsageAlert
+from api.timestamps import utc_now
+
+
+class UsageAnomalyScannerTest(TestCase):
+
+    def setUp(self):
+        self.scanner = UsageAnomalyScanner(batch_size=4, max_open_seconds=600, zscore=3)
+        self.dispenser = BeerTapDispenserFactory()
+        self.start = datetime(2022, 1, 1, 20)
+
+    def create_usages(self, durations):
+        usages = []
+        for i, duration in enumerate(durations):
+            opened_at = self.start + timedelta(minutes=i)
+            usages.append(BeerTapDispenserHistory(
+                dispenser=self.dispenser,
+                opened_at=opened_at,
+                closed_at=opened_at + timedelta(seconds=duration) if duration is not None else None,
+                flow_volume=self.dispenser.flow_volume
+            ))
+        BeerTapDispenserHistory.objects.bulk_create(usages)
+        self.start += timedelta(minutes=len(durations))
+
+    def test_running_stats(self):
+        durations = [8, 10, 12, 9, 11, 10, 10, 9, 11, 10]
+        self.create_usages(durations)
+
+        result = self.scanner.scan()
+        self.assertEqual(result, {'processed': 10, 'outliers': 0, 'open_too_long': 0})
+
+        stats = DispenserUsageStats.objects.get(dispenser=self.dispenser)
+        self.assertEqual(stats.count, 10)
+        self.assertAlmostEqual(stats.mean, 10)
+        mean = sum(durations) / len(durations)
+        variance = sum((d - mean) ** 2 for d in durations) / (len(durations) - 1)
+        self.assertAlmostEqual(stats.get_std() ** 2, variance)
+        self.assertFalse(BeerTapDispenserHistory.objects.filter(stats_processed=False).exists())
+
+    def test_incremental_scan(self):
+        self.create_usages([8, 10, 12, 9, 11, 10, 10, 9, 11, 10])
+        self.scanner.scan()
+
+        # only the usages closed since the last scan are read
+        self.create_usages([10, 120])
+        result = self.scanner.scan()
+        self.assertEqual(result, {'processed': 2, 'outliers': 1, 'open_too_long': 0})
+
+        alert = UsageAlert.objects.get()
+        self.assertEqual(alert.kind, UsageAlert.UsageAlertKind.DURATION_OUTLIER)
+        self.assertEqual(alert.duration, 120)
+        self.assertGreater(alert.zscore, 3)
+        self.assertEqual(DispenserUsageStats.objects.get(dispenser=self.dispenser).count, 12)
+
+        self.assertEqual(self.scanner.scan(), {'processed': 0, 'outliers': 0, 'open_too_long': 0})
+
+    def test_open_usages(self):
+        self.start = utc_now() - timedelta(hours=2)
+        self.create_usages([None])
+        recent = BeerTapDispenserFactory(flow_volume='0.0700')
+        recent.open(timestamp=utc_now())
+
+        result = self.scanner.scan()
+        self.assertEqual(result, {'processed': 0, 'outliers': 0, 'open_too_long': 1})
+
+        alert = UsageAlert.objects.get()
+        self.assertEqual(alert.kind, UsageAlert.UsageAlertKind.OPEN_TOO_LONG)
+        self.assertEqual(alert.dispenser, self.dispenser)
+
+        # the usage is flagged once
+        self.assertEqual(self.scanner.scan()['open_too_long'], 0)
+        self.assertEqual(UsageAlert.objects.count(), 1)
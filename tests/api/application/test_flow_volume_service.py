@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+
+from api.application.flow_volume_service import FlowVolumeUpdater
+from api.factory import BeerTapDispenserFactory, VenueFactory
+from api.models import BeerTapDispenser
+
+
+class FlowVolumeUpdaterTest(TestCase):
+
+    def setUp(self):
+        self.updater = FlowVolumeUpdater()
+        self.closed = BeerTapDispenserFactory(flow_volume='0.0600')
+        self.closed.open(timestamp=datetime.now() - timedelta(seconds=20))
+        self.closed.closed(timestamp=datetime.now() - timedelta(seconds=10))
+        self.open = BeerTapDispenserFactory(flow_volume='0.0610')
+        self.open.open(timestamp=datetime.now() - timedelta(seconds=10))
+        self.flow_volumes = {self.closed.id: Decimal('0.0700'), self.open.id: Decimal('0.0800')}
+
+    def refresh(self):
+        self.closed.refresh_from_db()
+        self.open.refresh_from_db()
+
+    def test_keep_open_usages(self):
+        closed_etag = self.closed.get_spending_validators()
+
+        result = self.updater.update(venue_code=self.closed.venue_id, flow_volumes=self.flow_volumes)
+
+        self.assertEqual(result, {'updated': 2, 'repriced_usages': 0})
+        self.refresh()
+        self.assertEqual(self.closed.flow_volume, Decimal('0.0700'))
+        self.assertEqual(self.open.flow_volume, Decimal('0.0800'))
+        self.assertEqual(self.open.usages.get().flow_volume, Decimal('0.0610'))
+        self.assertEqual(self.closed.get_spending_validators(), closed_etag)
+        self.assertEqual(self.open.version, 1)
+
+        # the next usages are opened with the new flow volume
+        self.closed.open(timestamp=datetime.now())
+        self.assertEqual(self.closed.usages.last().flow_volume, Decimal('0.0700'))
+
+    def test_open_after_the_update_of_a_loaded_dispenser(self):
+        # the controller loaded the dispenser before its flow volume changed
+        stale = BeerTapDispenser.objects.get(pk=self.closed.pk)
+        self.updater.update(venue_code=self.closed.venue_id, flow_volumes=self.flow_volumes)
+
+        stale.open(timestamp=datetime.now())
+        self.assertEqual(stale.usages.last().flow_volume, Decimal('0.0700'))
+
+    def test_reprice_open_usages(self):
+        closed_etag = self.closed.get_spending_validators()
+
+        result = self.updater.update(
+            venue_code=self.closed.venue_id,
+            flow_volumes=self.flow_volumes,
+            open_usages=FlowVolumeUpdater.REPRICE
+        )
+
+        self.assertEqual(result, {'updated': 2, 'repriced_usages': 1})
+        self.refresh()
+        self.assertEqual(self.open.usages.get().flow_volume, Decimal('0.0800'))
+        self.assertEqual(self.open.version, 2)
+        # the closed usages never change
+        self.assertEqual(self.closed.usages.get().flow_volume, Decimal('0.0600'))
+        self.assertEqual(self.closed.get_spending_validators(), closed_etag)
+
+    def test_dispensers_of_other_venue(self):
+        other = BeerTapDispenserFactory(venue=VenueFactory(), flow_volume='0.0620')
+
+        with self.assertRaises(ValidationError):
+            self.updater.update(
+                venue_code=self.closed.venue_id,
+                flow_volumes={self.closed.id: Decimal('0.0700'), other.id: Decimal('0.0700')}
+            )
+
+        self.assertFalse(BeerTapDispenser.objects.filter(flow_volume=Decimal('0.0700')).exists())
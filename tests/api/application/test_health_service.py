@@ -0,0 +1,70 @@
+import time
+from unittest import mock
+
+from django.db import connection, DatabaseError
+from django.test import TestCase
+
+from api.application.health_service import HealthService
+
+
+class HealthServiceTest(TestCase):
+
+    def setUp(self):
+        self.health_service = HealthService(connection, interval=60)
+
+    def test_liveness(self):
+        self.assertEqual(self.health_service.liveness(), {'status': 'alive'})
+
+    def test_readiness(self):
+        result, ready = self.health_service.readiness()
+        self.assertTrue(ready)
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['migrations'], {'ok': True, 'pending': 0})
+        self.assertFalse(result['cached'])
+        self.assertEqual(result['stats']['checks'], 1)
+        self.assertEqual(result['pool']['vendor'], connection.vendor)
+
+    def test_readiness_is_cached(self):
+        self.health_service.readiness()
+        with self.assertNumQueries(0):
+            result, ready = self.health_service.readiness()
+        self.assertTrue(ready)
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['stats']['checks'], 1)
+
+    def test_readiness_expired(self):
+        self.health_service.interval = 0
+        self.health_service.readiness()
+        # the migrations are checked once, after that only SELECT 1 is executed
+        with self.assertNumQueries(1):
+            result, ready = self.health_service.readiness()
+        self.assertFalse(result['cached'])
+        self.assertEqual(result['stats']['checks'], 2)
+
+    def test_readiness_database_error(self):
+        with mock.patch.object(connection, 'cursor', side_effect=DatabaseError('connection refused')), \
+                self.assertLogs('api.application.health_service', 'WARNING') as logs:
+            result, ready = self.health_service.readiness()
+        self.assertFalse(ready)
+        self.assertEqual(result['status'], 'unavailable')
+        self.assertEqual(result['stats']['failures'], 1)
+        # the message is logged, the probe only gets the type of the error
+        self.assertEqual(result['database']['error'], 'DatabaseError')
+        self.assertIn('connection refused', logs.output[0])
+
+    def test_readiness_while_another_probe_checks(self):
+        self.health_service.readiness()
+        self.health_service.expires_at = 0
+        self.health_service.checking_since = time.monotonic()
+        # the previous result while the check is recent, without waiting for it
+        with self.assertNumQueries(0):
+            result, ready = self.health_service.readiness()
+        self.assertTrue(ready)
+        self.assertTrue(result['cached'])
+
+        # unavailable once the check takes longer than the interval
+        self.health_service.checking_since -= self.health_service.interval + 1
+        with self.assertNumQueries(0):
+            result, ready = self.health_service.readiness()
+        self.assertFalse(ready)
+        self.assertEqual(result['database']['error'], 'check in progress')
@@ -0,0 +1,66 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from api.application.pricing_simulator import PricingScenario, PricingSimulator, np
+from api.factory import BeerTapDispenserFactory
+from api.models import BeerTapDispenserHistory
+from api.timestamps import utc_now
+
+
+@unittest.skipUnless(np, 'numpy is not installed')
+@override_settings(MAX_POUR_SECONDS=600)
+class PricingSimulatorTest(TestCase):
+
+    def setUp(self):
+        rnd = random.Random(38)
+        start = datetime(2022, 1, 1, 20)
+        self.dispensers = [
+            BeerTapDispenserFactory(flow_volume=flow_volume) for flow_volume in ('0.0653', '0.0800', '0.1234')
+        ]
+        BeerTapDispenserHistory.objects.bulk_create(
+            BeerTapDispenserHistory(
+                dispenser=dispenser,
+                opened_at=start + timedelta(minutes=i),
+                closed_at=start + timedelta(minutes=i, seconds=rnd.randint(0, 900), microseconds=rnd.randint(0, 999999)),
+                # some usages have the flow volume the dispenser had before
+                flow_volume=Decimal('0.0500') if i % 7 == 0 else dispenser.flow_volume
+            )
+            for dispenser in self.dispensers
+            for i in range(200)
+        )
+        # an open usage longer than MAX_POUR_SECONDS
+        self.dispensers[0].open(timestamp=utc_now() - timedelta(hours=1))
+        self.simulator = PricingSimulator(max_pour_seconds=600, chunk_size=64)
+
+    def test_current_scenario_matches_total_spent(self):
+        self.assertEqual(self.simulator.load(), 601)
+
+        result = self.simulator.simulate(PricingScenario('current', settings.PRICE_BY_LITER), [])
+
+        for dispenser in self.dispensers:
+            self.assertEqual(result[dispenser.id]['amount'], dispenser.total_spent())
+
+    def test_scenarios(self):
+        self.simulator.load()
+        dispenser = self.dispensers[1]
+        result = self.simulator.simulate(
+            PricingScenario('current', settings.PRICE_BY_LITER),
+            [PricingScenario('price', '13.5'), PricingScenario('flow', settings.PRICE_BY_LITER, {dispenser.id: '0.1'})]
+        )
+
+        with self.settings(PRICE_BY_LITER=Decimal('13.5')):
+            amounts = {d.id: d.total_spent() for d in self.dispensers}
+        for d in self.dispensers:
+            price = result[d.id]['scenarios']['price']
+            self.assertEqual(price['amount'], amounts[d.id])
+            self.assertEqual(price['delta'], amounts[d.id] - d.total_spent())
+
+        BeerTapDispenserHistory.objects.filter(dispenser=dispenser).update(flow_volume=Decimal('0.1'))
+        flow = result[dispenser.id]['scenarios']['flow']
+        self.assertEqual(flow['amount'], dispenser.total_spent())
+        self.assertEqual(result[self.dispensers[0].id]['scenarios']['flow']['delta'], 0)
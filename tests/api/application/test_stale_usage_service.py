@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+
+from api.application.stale_usage_service import StaleUsageCloser
+from api.exceptions import DispenserAlreadyOpenOrClosedException
+from api.factory import BeerTapDispenserFactory
+from api.models import BeerTapDispenser, DispenserUsageSketch
+from api.timestamps import utc_now
+
+
+@override_settings(MAX_POUR_SECONDS=600)
+class StaleUsageCloserTest(TestCase):
+
+    def setUp(self):
+        self.closer = StaleUsageCloser(max_pour_seconds=600, batch_size=2)
+
+    def open_dispenser(self, flow_volume, opened_at):
+        dispenser = BeerTapDispenserFactory(flow_volume=flow_volume)
+        dispenser.open(timestamp=opened_at)
+        return dispenser
+
+    def test_close_stale_usages(self):
+        opened_at = utc_now() - timedelta(hours=3)
+        stale = [self.open_dispenser(flow_volume, opened_at) for flow_volume in ('0.0610', '0.0620', '0.0630')]
+        recent = self.open_dispenser('0.0640', utc_now())
+        # the amount is capped while the usage is still open
+        amounts = [dispenser.total_spent() for dispenser in stale]
+
+        self.assertEqual(self.closer.close(), 3)
+
+        for dispenser, amount in zip(stale, amounts):
+            dispenser.refresh_from_db()
+            usage = dispenser.usages.get()
+            self.assertEqual(dispenser.status, BeerTapDispenser.BeerTapDispenserStatus.CLOSED)
+            self.assertEqual(dispenser.version, 2)
+            self.assertEqual(usage.closed_at, opened_at + timedelta(seconds=600))
+            self.assertEqual(usage.closed_at_us, usage.opened_at_us + 600 * 1000000)
+            self.assertTrue(usage.stats_processed)
+            self.assertEqual(dispenser.total_spent(), amount)
+            self.assertEqual(dispenser.usage_sketches.get().seconds, 600)
+
+        recent.refresh_from_db()
+        self.assertEqual(recent.status, BeerTapDispenser.BeerTapDispenserStatus.OPEN)
+        self.assertIsNone(recent.usages.get().closed_at)
+        self.assertFalse(DispenserUsageSketch.objects.filter(dispenser=recent).exists())
+
+        self.assertEqual(self.closer.close(), 0)
+
+    def test_dispenser_can_be_opened_again(self):
+        dispenser = self.open_dispenser('0.0610', utc_now() - timedelta(hours=3))
+        self.closer.close()
+
+        dispenser.refresh_from_db()
+        dispenser.open(timestamp=utc_now())
+        self.assertEqual(dispenser.usages.count(), 2)
+
+    def test_controller_close_after_the_closer(self):
+        # the controller loaded the dispenser while its usage was still open
+        dispenser = self.open_dispenser('0.0610', utc_now() - timedelta(hours=3))
+        self.closer.close()
+
+        with self.assertRaises(DispenserAlreadyOpenOrClosedException):
+            dispenser.closed(timestamp=utc_now())
+
+        usage = dispenser.usages.get()
+        self.assertEqual(usage.closed_at, usage.opened_at + timedelta(seconds=600))
+        self.assertEqual(dispenser.usage_sketches.get().count, 1)
+        dispenser.refresh_from_db()
+        self.assertEqual(dispenser.version, 2)
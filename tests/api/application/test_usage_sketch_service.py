@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from api.application.usage_sketch_service import UsageSketchBuilder
+from api.factory import BeerTapDispenserFactory
+from api.models import BeerTapDispenserHistory, DispenserUsageSketch
+from api.timestamps import to_epoch_us
+
+
+@override_settings(USAGE_SKETCH_BUCKET_SECONDS=3600, MAX_POUR_SECONDS=600)
+class UsageSketchBuilderTest(TestCase):
+
+    def setUp(self):
+        self.dispenser = BeerTapDispenserFactory(flow_volume='0.1000')
+        self.start = datetime(2022, 1, 1, 20)
+
+    def pour(self, opened_at, seconds):
+        self.dispenser.open(timestamp=opened_at)
+        self.dispenser.closed(timestamp=opened_at + timedelta(seconds=seconds))
+
+    def test_sketches_are_updated_on_close(self):
+        self.pour(self.start, 10)
+        self.pour(self.start + timedelta(minutes=10), 30)
+        self.pour(self.start + timedelta(hours=1), 20)
+        # charged MAX_POUR_SECONDS
+        self.pour(self.start + timedelta(hours=2), 900)
+
+        sketches = DispenserUsageSketch.objects.filter(dispenser=self.dispenser).order_by('bucket_us')
+        self.assertEqual([(s.count, s.seconds, s.liters) for s in sketches], [
+            (2, 40, Decimal('4.0000')), (1, 20, Decimal('2.0000')), (1, 600, Decimal('60.0000'))
+        ])
+
+        stats = DispenserUsageSketch.objects.get_stats(self.dispenser.id)
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['average'], 165)
+        self.assertEqual(stats['liters'], Decimal('66.0000'))
+        self.assertEqual(stats['buckets'], 3)
+
+    def test_rebuild(self):
+        for minute in range(0, 180, 15):
+            self.pour(self.start + timedelta(minutes=minute), minute % 40 + 5)
+        expected = DispenserUsageSketch.objects.get_stats(self.dispenser.id)
+        # usages closed before the sketches existed
+        BeerTapDispenserHistory.objects.create(
+            dispenser=self.dispenser, opened_at=self.start + timedelta(hours=5),
+            closed_at=self.start + timedelta(hours=5, seconds=8), flow_volume='0.1000'
+        )
+        DispenserUsageSketch.objects.all().delete()
+
+        self.assertEqual(UsageSketchBuilder(chunk_size=5).rebuild(), (1, 13))
+
+        stats = DispenserUsageSketch.objects.get_stats(self.dispenser.id)
+        self.assertEqual(stats['count'], expected['count'] + 1)
+        self.assertEqual(stats['liters'], expected['liters'] + Decimal('0.8'))
+        # the same stats than the incremental sketches before the new usage
+        window = DispenserUsageSketch.objects.get_stats(
+            self.dispenser.id, end_us=to_epoch_us(self.start + timedelta(hours=2, minutes=59))
+        )
+        self.assertEqual(window, expected)
@@ -0,0 +1,80 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import TestCase
+
+from api.domain.dispenser import (
+    DispenserEngine,
+    DispenserConflictError,
+    InvalidTimestampError,
+    OPEN,
+    CLOSED,
+    billable_seconds,
+    usage_cost
+)
+from api.domain.repositories import InMemoryDispenserRepository
+
+
+class DispenserEngineTest(TestCase):
+
+    def setUp(self):
+        self.repository = InMemoryDispenserRepository()
+        self.repository.create(1, Decimal('0.0653'))
+        self.engine = DispenserEngine(self.repository, price_by_liter=12.25, max_pour_seconds=600)
+        self.opened_at = datetime(2022, 1, 1, 20)
+
+    def test_open_and_close(self):
+        self.engine.execute_operation(1, OPEN, self.opened_at)
+        usage = self.engine.execute_operation(1, CLOSED, self.opened_at + timedelta(seconds=22))
+        dispenser = self.repository.get(1)
+
+        self.assertEqual(dispenser.status, CLOSED)
+        self.assertEqual(dispenser.version, 2)
+        self.assertIsNone(self.repository.get_open_usage(1))
+        self.assertEqual(usage.closed_at, self.opened_at + timedelta(seconds=22))
+        self.assertEqual(self.engine.total_spent(1), Decimal('17.598'))
+
+    def test_open_twice(self):
+        self.engine.open(1, self.opened_at)
+        with self.assertRaises(DispenserConflictError):
+            self.engine.open(1, self.opened_at + timedelta(seconds=1))
+
+    def test_close_twice(self):
+        with self.assertRaises(DispenserConflictError):
+            self.engine.closed(1, self.opened_at)
+
+    def test_close_before_open(self):
+        self.engine.open(1, self.opened_at)
+        with self.assertRaises(InvalidTimestampError):
+            self.engine.closed(1, self.opened_at)
+        self.assertEqual(self.repository.get(1).status, OPEN)
+
+    def test_open_usage_is_charged_until_now(self):
+        self.engine.open(1, self.opened_at)
+        now = self.opened_at + timedelta(seconds=10)
+        self.assertEqual(self.engine.total_spent(1, now=now), usage_cost(Decimal(12.25), Decimal('0.0653'), 10))
+        # the open usages are capped as well
+        self.assertEqual(
+            self.engine.total_spent(1, now=now + timedelta(hours=1)),
+            usage_cost(Decimal(12.25), Decimal('0.0653'), 600)
+        )
+
+    def test_random_pours(self):
+        """
+            Random pours must be charged as the sum of the cost of each usage
+        """
+        rnd = random.Random(37)
+        timestamp = self.opened_at
+        expected = []
+        for _ in range(500):
+            opened_at = timestamp + timedelta(seconds=rnd.randint(1, 60))
+            timestamp = opened_at + timedelta(seconds=rnd.randint(1, 1200), microseconds=rnd.randint(0, 999999))
+            self.engine.open(1, opened_at)
+            self.engine.closed(1, timestamp)
+            seconds = billable_seconds(opened_at, timestamp, None, 600)
+            self.assertLessEqual(seconds, 600)
+            expected.append(round(Decimal(12.25) * Decimal('0.0653') * seconds, 3))
+
+        self.assertEqual(self.engine.total_spent(1), round(sum(expected), 3))
+        self.assertEqual(self.repository.get(1).version, 1000)
+        self.assertEqual(len(self.repository.get_usages(1)), 500)
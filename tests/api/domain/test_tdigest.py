@@ -0,0 +1,57 @@
+import random
+from unittest import TestCase
+
+from api.domain.tdigest import TDigest
+
+
+class TDigestTest(TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.values = [rng.expovariate(1 / 30) for _ in range(20000)]
+        self.sorted_values = sorted(self.values)
+
+    def exact(self, q):
+        return self.sorted_values[int(q * len(self.sorted_values))]
+
+    def test_empty(self):
+        digest = TDigest()
+        self.assertEqual(digest.count, 0)
+        self.assertIsNone(digest.quantile(0.5))
+        self.assertEqual(TDigest.from_dict(digest.to_dict()).quantile(0.5), None)
+
+    def test_small_digests_are_exact(self):
+        digest = TDigest()
+        digest.add(5)
+        self.assertEqual(digest.quantile(0.5), 5)
+
+        for value in (1, 2, 3, 4):
+            digest.add(value)
+        self.assertEqual(digest.quantile(0), 1)
+        self.assertEqual(digest.quantile(0.5), 3)
+        self.assertEqual(digest.quantile(1), 5)
+
+    def test_quantiles(self):
+        digest = TDigest()
+        for value in self.values:
+            digest.add(value)
+
+        self.assertEqual(digest.count, len(self.values))
+        self.assertLessEqual(len(digest.to_dict()['centroids']), 100)
+        for q in (0.5, 0.95, 0.99):
+            self.assertAlmostEqual(digest.quantile(q), self.exact(q), delta=self.exact(q) * 0.02)
+
+    def test_merged_digests(self):
+        # the buckets are serialized and merged at query time
+        parts = [TDigest() for _ in range(24)]
+        for index, value in enumerate(self.values):
+            parts[index % 24].add(value)
+        digest = TDigest()
+        for part in parts:
+            digest.merge(TDigest.from_dict(part.to_dict()))
+
+        self.assertEqual(digest.count, len(self.values))
+        self.assertEqual(digest.quantile(0), self.sorted_values[0])
+        self.assertEqual(digest.quantile(1), self.sorted_values[-1])
+        for q in (0.5, 0.95, 0.99):
+            self.assertAlmostEqual(digest.quantile(q), self.exact(q), delta=self.exact(q) * 0.02)
@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from api.domain.dispenser import DispenserConflictError, DispenserEngine, OPEN, CLOSED
+from api.domain.repositories import InMemoryDispenserRepository
+from api.factory import BeerTapDispenserFactory
+from api.infrastructure.django_repository import DjangoDispenserRepository
+from api.timestamps import utc_now
+
+
+@override_settings(MAX_POUR_SECONDS=600)
+class DjangoDispenserRepositoryTest(TestCase):
+
+    def test_parity_with_in_memory_repository(self):
+        """
+            The same operations over both repositories must give the same state and the same
+            amount than BeerTapDispenser.total_spent
+        """
+        dispenser = BeerTapDispenserFactory(flow_volume=Decimal('0.0653'))
+        memory = InMemoryDispenserRepository()
+        memory.create(dispenser.id, dispenser.flow_volume)
+        engines = [
+            DispenserEngine(repository, settings.PRICE_BY_LITER, max_pour_seconds=600)
+            for repository in (memory, DjangoDispenserRepository())
+        ]
+
+        rnd = random.Random(37)
+        timestamp = datetime(2022, 1, 1, 20)
+        for _ in range(20):
+            opened_at = timestamp + timedelta(seconds=rnd.randint(1, 60))
+            timestamp = opened_at + timedelta(seconds=rnd.randint(1, 1200))
+            for engine in engines:
+                engine.execute_operation(dispenser.id, OPEN, opened_at)
+                engine.execute_operation(dispenser.id, CLOSED, timestamp)
+
+        dispenser.refresh_from_db()
+        self.assertEqual(dispenser.status, CLOSED)
+        self.assertEqual(dispenser.version, memory.get(dispenser.id).version)
+        self.assertEqual(dispenser.usages.count(), 20)
+        for engine in engines:
+            self.assertEqual(engine.total_spent(dispenser.id), dispenser.total_spent())
+
+    def test_parity_of_an_open_usage(self):
+        # without now the engine prices the open usages at the same instant than total_spent
+        dispenser = BeerTapDispenserFactory(flow_volume=Decimal('0.0655'))
+        dispenser.open(timestamp=utc_now() - timedelta(seconds=60))
+        engine = DispenserEngine(DjangoDispenserRepository(), settings.PRICE_BY_LITER, max_pour_seconds=600)
+
+        self.assertAlmostEqual(engine.total_spent(dispenser.id), dispenser.total_spent(), delta=Decimal('0.01'))
+
+    def test_close_usage_already_closed(self):
+        dispenser = BeerTapDispenserFactory(flow_volume=Decimal('0.0654'))
+        repository = DjangoDispenserRepository()
+        engine = DispenserEngine(repository, settings.PRICE_BY_LITER)
+        usage = engine.open(dispenser.id, datetime(2022, 1, 1, 20))
+        engine.closed(dispenser.id, datetime(2022, 1, 1, 20, 1))
+
+        # the usage was loaded before it was closed
+        usage.closed_at = datetime(2022, 1, 1, 20, 2)
+        with self.assertRaises(DispenserConflictError):
+            repository.close_usage(usage)
+        self.assertEqual(dispenser.usages.get().closed_at, datetime(2022, 1, 1, 20, 1))
+        self.assertEqual(dispenser.usage_sketches.get().count, 1)
@@ -0,0 +1,31 @@
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from api.application.health_service import HealthService
+from api.infrastructure.health_views import LivenessView, ReadinessView
+
+
+class HealthViewsTest(TestCase):
+
+    def setUp(self):
+        self.health_service = HealthService(connection, interval=60)
+
+    def test_get_liveness(self):
+        response = LivenessView(self.health_service).get(request='')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_readiness(self):
+        response = ReadinessView(self.health_service).get(request='')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_readiness_not_ready(self):
+        self.health_service.migrations_applied = False
+        self.health_service.check_migrations = lambda: {'ok': False, 'pending': 1}
+        response = ReadinessView(self.health_service).get(request='')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_urls(self):
+        self.assertEqual(self.client.get(reverse('api:health-live')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('api:health-ready')).status_code, status.HTTP_200_OK)
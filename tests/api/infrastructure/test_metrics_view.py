@@ -0,0 +1,21 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from api.infrastructure.metrics_view import MetricsView
+from api.middleware import ConcurrencyLimiter
+
+
+class MetricsViewTest(TestCase):
+
+    def test_get_metrics(self):
+        response = MetricsView(ConcurrencyLimiter(limit=4, timeout=0)).get(request='')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['concurrency']['limit'], 4)
+        self.assertIn('throttled', data)
+
+    def test_url(self):
+        self.assertEqual(self.client.get(reverse('api:metrics')).status_code, status.HTTP_200_OK)
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+from django.http import Http404
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from api.infrastructure.schema_view import SchemaFileView
+
+
+class SchemaFileViewTest(TestCase):
+
+    def setUp(self):
+        SchemaFileView.content = None
+        self.addCleanup(setattr, SchemaFileView, 'content', None)
+
+    def test_get_schema(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_file = os.path.join(directory, 'openapi.json')
+            with open(schema_file, 'w') as f:
+                f.write('{"swagger": "2.0"}')
+
+            with override_settings(OPENAPI_SCHEMA_FILE=schema_file):
+                response = SchemaFileView().get(request='')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'{"swagger": "2.0"}')
+
+        # the file is read once, the next requests use the content in memory
+        self.assertEqual(SchemaFileView().get(request='').content, b'{"swagger": "2.0"}')
+
+    def test_get_schema_not_generated(self):
+        with override_settings(OPENAPI_SCHEMA_FILE='/not/found/openapi.json'):
+            with self.assertRaises(Http404):
+                SchemaFileView().get(request='')
@@ -4,14 +4,19 @@ from decimal import Decimal
 
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.core.cache import cache
 from django.urls import reverse
 
-from api.factory import BeerTapDispenserFactory
-from api.models import BeerTapDispenser, BeerTapDispenserHistory
+from api.factory import BeerTapDispenserFactory, VenueFactory
+from api.ids import get_venue_code
+from api.models import BeerTapDispenser, BeerTapDispenserHistory, IdempotencyKey, get_pricing_fingerprint
+from api.timestamps import utc_now
 
 
 class BeerTapDispenserViewSetTest(APITestCase):
     def setUp(self) -> None:
+        # the throttling buckets are kept in the cache
+        cache.clear()
         self.create_url = reverse('api:beertapdispenser-list')
         self.status_url = 'api:beertapdispenser-status'
         self.spending_url = 'api:beertapdispenser-spending'
@@ -25,9 +30,9 @@ class BeerTapDispenserViewSetTest(APITestCase):
             'updated_at': '2022-01-01T02:00:50'
         }
 
-    def send_status_request(self, data: dict, pk: str):
+    def send_status_request(self, data: dict, pk: str, **extra):
         status_url = reverse(self.status_url, kwargs={'pk': pk})
-        return self.client.put(status_url, data=data, format='json')
+        return self.client.put(status_url, data=data, format='json', **extra)
 
     def open_tap_dispenser(self, btd: BeerTapDispenserFactory):
         return self.send_status_request(data=self.open_data, pk=btd.pk)
@@ -133,7 +138,7 @@ class BeerTapDispenserViewSetTest(APITestCase):
         # create dispenser
         btd = BeerTapDispenser.objects.create(flow_volume=0.0654)
 
-        now = datetime.now()
+        now = utc_now()
         first_now = now - timedelta(hours=1)
 
         # records similar to api example -> https://shorturl.at/afyBM
@@ -172,3 +177,199 @@ class BeerTapDispenserViewSetTest(APITestCase):
         # check if any element contains closed_at = None
         any_value_contains = any(u.get('closed_at') is None for u in response.data.get('usages'))
         self.assertTrue(any_value_contains)
+
+    def test_spending_etag(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse(self.spending_url, kwargs={'pk': btd.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = f'"0-{get_pricing_fingerprint()}"'
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        # only the dispenser is read, the usages are not calculated
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        last_modified = response['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_spending_etag_changes_with_status(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse(self.spending_url, kwargs={'pk': btd.pk})
+        self.open_tap_dispenser(btd=btd)
+        self.close_tap_dispenser(btd=btd)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"0-{get_pricing_fingerprint()}"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"2-{get_pricing_fingerprint()}"')
+        self.assertEqual(len(response.data.get('usages')), 1)
+
+    def test_spending_open_is_not_validated(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse(self.spending_url, kwargs={'pk': btd.pk})
+        self.open_tap_dispenser(btd=btd)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'max-age=1')
+
+    def test_status_idempotency_key_replay(self):
+        btd = BeerTapDispenserFactory()
+        self.open_tap_dispenser(btd=btd)
+
+        response = self.send_status_request(data=self.closed_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='close-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.closed_data)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+        # the retry carries a new timestamp, the first result is returned and the usage is not closed again
+        retry_data = {'status': 'closed', 'updated_at': '2022-01-01T02:05:00'}
+        with self.assertNumQueries(1):
+            response = self.send_status_request(data=retry_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='close-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.closed_data)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+        usage = btd.usages.get()
+        self.assertEqual(usage.closed_at, datetime(2022, 1, 1, 2, 0, 50))
+        btd.refresh_from_db()
+        self.assertEqual(btd.version, 2)
+
+    def test_status_idempotency_key_mismatch(self):
+        btd = BeerTapDispenserFactory()
+        response = self.send_status_request(data=self.open_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.send_status_request(data=self.closed_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        other = BeerTapDispenser.objects.create(flow_volume=Decimal('0.0653'))
+        response = self.send_status_request(data=self.open_data, pk=other.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_status_idempotency_key_is_scoped_by_venue(self):
+        btd = BeerTapDispenserFactory()
+        other = BeerTapDispenserFactory(venue=VenueFactory(), flow_volume='0.0700')
+        response = self.send_status_request(data=self.open_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the same key sent by a controller of another venue is a different request
+        response = self.send_status_request(
+            data=self.open_data, pk=other.pk, HTTP_IDEMPOTENCY_KEY='key-1', HTTP_X_VENUE=other.venue_id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyKey.objects.filter(key='key-1').count(), 2)
+
+    def test_status_idempotency_key_not_stored_on_error(self):
+        btd = BeerTapDispenserFactory()
+        response = self.send_status_request(data=self.closed_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_status_idempotency_key_expired(self):
+        btd = BeerTapDispenserFactory()
+        self.send_status_request(data=self.open_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.close_tap_dispenser(btd=btd)
+        IdempotencyKey.objects.update(created_at=datetime.now() - timedelta(days=2))
+
+        # the expired key is forgotten and the request is executed again
+        response = self.send_status_request(data=self.open_data, pk=btd.pk, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(btd.usages.count(), 2)
+
+    def test_create_beer_tap_dispenser_in_venue(self):
+        venue = VenueFactory()
+        response = self.client.post(self.create_url, data=self.flow_volume_data, format='json', HTTP_X_VENUE=venue.code)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        btd = BeerTapDispenser.objects.get(pk=response.data.get('id'))
+        self.assertEqual(btd.venue, venue)
+        self.assertEqual(get_venue_code(btd.id), venue.code)
+
+    def test_create_beer_tap_dispenser_unknown_venue(self):
+        for code in ('999', 'wrong', '65535', '-1'):
+            response = self.client.post(self.create_url, data=self.flow_volume_data, format='json', HTTP_X_VENUE=code)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(BeerTapDispenser.objects.exists())
+
+    def test_requests_are_scoped_by_venue(self):
+        btd = BeerTapDispenserFactory(venue=VenueFactory())
+        url = reverse(self.spending_url, kwargs={'pk': btd.pk})
+
+        # the dispenser is not visible from the default venue
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.open_tap_dispenser(btd=btd).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(self.client.get(url, HTTP_X_VENUE=btd.venue_id).status_code, status.HTTP_200_OK)
+        response = self.send_status_request(data=self.open_data, pk=btd.pk, HTTP_X_VENUE=btd.venue_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_flow_volume(self):
+        btd = BeerTapDispenserFactory(flow_volume='0.0600')
+        self.open_tap_dispenser(btd=btd)
+        url = reverse('api:beertapdispenser-flow-volume')
+        data = {'dispensers': [{'id': str(btd.pk), 'flow_volume': 0.08}], 'open_usages': 'reprice'}
+
+        response = self.client.patch(url, data=data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'updated': 1, 'repriced_usages': 1})
+        self.assertEqual(btd.usages.get().flow_volume, Decimal('0.0800'))
+
+    def test_update_flow_volume_invalid(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse('api:beertapdispenser-flow-volume')
+        for data in (
+            {'dispensers': []},
+            {'dispensers': [{'id': str(btd.pk), 'flow_volume': 0.08}] * 2},
+            {'dispensers': [{'id': str(btd.pk), 'flow_volume': 0.08}], 'open_usages': 'ignore'},
+            {'dispensers': [{'id': str(uuid.uuid4()), 'flow_volume': 0.08}]},
+        ):
+            response = self.client.patch(url, data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stats(self):
+        btd = BeerTapDispenserFactory(flow_volume='0.1000')
+        url = reverse('api:beertapdispenser-stats', kwargs={'pk': btd.pk})
+        for opened_at, seconds in (('2022-01-01T02:00:00', 10), ('2022-01-01T02:10:00', 20), ('2022-01-02T02:00:00', 30)):
+            opened_at = datetime.fromisoformat(opened_at)
+            self.send_status_request({'status': 'open', 'updated_at': opened_at.isoformat()}, pk=btd.pk)
+            closed_at = opened_at + timedelta(seconds=seconds)
+            self.send_status_request({'status': 'closed', 'updated_at': closed_at.isoformat()}, pk=btd.pk)
+        # open usages are counted once they are closed
+        self.send_status_request({'status': 'open', 'updated_at': '2022-01-03T02:00:00'}, pk=btd.pk)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'count': 3, 'average': 20.0, 'p50': 20.0, 'p95': 30.0, 'liters': 6.0, 'buckets': 2
+        })
+
+        response = self.client.get(url, {'start': '2022-01-01T00:00:00Z', 'end': '2022-01-01T23:59:59Z'})
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['liters'], 3.0)
+
+        response = self.client.get(url, {'start': '2022-01-05T00:00:00Z'})
+        self.assertEqual(response.json(), {
+            'count': 0, 'average': None, 'p50': None, 'p95': None, 'liters': 0.0, 'buckets': 0
+        })
+
+    def test_stats_fail(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse('api:beertapdispenser-stats', kwargs={'pk': btd.pk})
+        response = self.client.get(url, {'start': '2022-01-02T00:00:00Z', 'end': '2022-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'start': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('api:beertapdispenser-stats', kwargs={'pk': uuid.uuid4()}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
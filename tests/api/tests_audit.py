@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.audit import AuditLog, FileAuditSink, audit_log
+from api.factory import BeerTapDispenserFactory
+
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+
+    def write(self, records):
+        self.batches.append(records)
+
+
+class FailingSink:
+    def write(self, records):
+        raise OSError('disk full')
+
+
+class AuditLogTest(SimpleTestCase):
+
+    def create_log(self, sink, capacity=10, batch_size=2):
+        log = AuditLog(sink=sink, capacity=capacity, batch_size=batch_size, flush_interval=60)
+        # the records stay in the buffer until flush() is called
+        log.thread = mock.Mock(is_alive=lambda: True)
+        return log
+
+    def test_flush_in_batches(self):
+        sink = ListSink()
+        log = self.create_log(sink)
+        for i in range(5):
+            log.append({'i': i})
+
+        self.assertEqual(log.flush(), 5)
+        self.assertEqual([[r['i'] for r in batch] for batch in sink.batches], [[0, 1], [2, 3], [4]])
+        self.assertEqual(log.get_stats(), {'recorded': 5, 'pending': 0, 'dropped': 0, 'flushed': 5, 'failed': 0})
+
+    def test_full_buffer_drops_the_oldest_records(self):
+        sink = ListSink()
+        log = self.create_log(sink, capacity=3, batch_size=10)
+        for i in range(5):
+            log.append({'i': i})
+
+        log.flush()
+        self.assertEqual([r['i'] for r in sink.batches[0]], [2, 3, 4])
+        self.assertEqual(log.get_stats()['dropped'], 2)
+
+    def test_failing_sink(self):
+        log = self.create_log(FailingSink())
+        log.append({'i': 0})
+
+        with self.assertLogs('api.audit', level='ERROR'):
+            self.assertEqual(log.flush(), 0)
+        self.assertEqual(log.get_stats()['failed'], 1)
+
+    def test_background_flush(self):
+        sink = ListSink()
+        log = AuditLog(sink=sink, capacity=10, batch_size=1, flush_interval=60)
+        log.append({'i': 0})
+
+        # the thread is woken up as soon as a batch is waiting
+        deadline = time.monotonic() + 1
+        while not sink.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sink.batches, [[{'i': 0}]])
+
+    def test_file_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit.jsonl')
+            sink = FileAuditSink(path)
+            sink.write([{'i': 0}])
+            sink.write([{'i': 1}, {'i': 2}])
+
+            with open(path) as audit_file:
+                self.assertEqual([json.loads(line)['i'] for line in audit_file], [0, 1, 2])
+
+
+class AuditedStatusTest(APITestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        audit_log.flush()
+        self.sink = ListSink()
+        patcher = mock.patch.object(audit_log, 'sink', self.sink)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_records(self):
+        audit_log.flush()
+        return [record for batch in self.sink.batches for record in batch]
+
+    def test_status_requests_are_recorded(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse('api:beertapdispenser-status', kwargs={'pk': btd.pk})
+        data = {'status': 'open', 'updated_at': '2022-01-01T02:00:00'}
+
+        self.assertEqual(self.client.put(url, data=data, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.put(url, data=data, format='json').status_code, status.HTTP_409_CONFLICT)
+        response = self.client.put(url, data={'status': 'broken'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        records = self.get_records()
+        self.assertEqual([r['status_code'] for r in records], [200, 409, 400])
+        self.assertEqual([r['outcome'] for r in records], ['ok', 'rejected', 'rejected'])
+        self.assertEqual(records[0]['payload'], data)
+        self.assertEqual(records[0]['dispenser'], str(btd.pk))
+        self.assertIsNone(records[0]['error'])
+        self.assertIn('status', records[2]['error'])
+        self.assertGreater(records[0]['latency'], 0)
@@ -0,0 +1,109 @@
+import unittest
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+
+from api.application.pricing_simulator import np
+from api.factory import BeerTapDispenserFactory
+from api.models import IdempotencyKey
+from api.timestamps import utc_now
+
+
+class PurgeIdempotencyKeysCommandTest(TestCase):
+    def setUp(self) -> None:
+        self.dispenser = BeerTapDispenserFactory()
+
+    def create_key(self, key, age):
+        idempotency_key = IdempotencyKey.objects.create(
+            key=key,
+            dispenser=self.dispenser,
+            status='open',
+            updated_at=datetime.now()
+        )
+        IdempotencyKey.objects.filter(pk=idempotency_key.pk).update(created_at=datetime.now() - age)
+
+    def test_purge_expired_keys(self):
+        self.create_key('old', age=timedelta(days=2))
+        self.create_key('new', age=timedelta(minutes=1))
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), '1 idempotency keys deleted')
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class ScanUsageAnomaliesCommandTest(TestCase):
+    def test_scan(self):
+        dispenser = BeerTapDispenserFactory()
+        dispenser.open(timestamp=datetime.now() - timedelta(seconds=10))
+        dispenser.closed(timestamp=datetime.now())
+
+        out = StringIO()
+        call_command('scan_usage_anomalies', '--batch-size=10', stdout=out)
+
+        self.assertEqual(
+            out.getvalue().strip(),
+            '1 usages processed, 0 duration outliers, 0 usages open too long'
+        )
+
+
+class CloseStaleUsagesCommandTest(TestCase):
+    @override_settings(MAX_POUR_SECONDS=60)
+    def test_close(self):
+        BeerTapDispenserFactory().open(timestamp=utc_now() - timedelta(minutes=5))
+
+        out = StringIO()
+        call_command('close_stale_usages', stdout=out)
+        self.assertEqual(out.getvalue().strip(), '1 stale usages closed')
+
+    @override_settings(MAX_POUR_SECONDS=None)
+    def test_close_without_max_pour(self):
+        with self.assertRaises(CommandError):
+            call_command('close_stale_usages')
+
+
+@unittest.skipUnless(np, 'numpy is not installed')
+class SimulatePricingCommandTest(TestCase):
+    def setUp(self) -> None:
+        self.dispenser = BeerTapDispenserFactory(flow_volume='0.0653')
+        self.dispenser.open(timestamp=datetime(2022, 1, 1, 20))
+        self.dispenser.closed(timestamp=datetime(2022, 1, 1, 20, 0, 22))
+
+    @override_settings(PRICE_BY_LITER=12.25)
+    def test_simulate(self):
+        out = StringIO()
+        call_command('simulate_pricing', '--price=13.5', f'--flow={self.dispenser.id}=0.1', stdout=out)
+
+        self.assertEqual(out.getvalue().strip().split('\n'), [
+            f'{self.dispenser.id} current 17.598 price=13.5 29.700 (+12.102)',
+            '1 usages, total current 17.598 price=13.5 29.700 (+12.102)'
+        ])
+
+    def test_simulate_invalid_flow(self):
+        with self.assertRaises(CommandError):
+            call_command('simulate_pricing', f'--flow={self.dispenser.id}=0.00001')
+
+    def test_simulate_without_scenarios(self):
+        with self.assertRaises(CommandError):
+            call_command('simulate_pricing')
+
+
+class RebuildUsageSketchesCommandTest(TestCase):
+
+    def test_rebuild_usage_sketches(self):
+        dispenser = BeerTapDispenserFactory()
+        dispenser.open(timestamp=datetime(2022, 1, 1, 20))
+        dispenser.closed(timestamp=datetime(2022, 1, 1, 20, 0, 15))
+        out = StringIO()
+
+        call_command('rebuild_usage_sketches', '--dispenser', str(dispenser.id), stdout=out)
+
+        self.assertIn('1 usages of 1 dispensers', out.getvalue())
+        self.assertEqual(dispenser.usage_sketches.get().count, 1)
+
+    def test_invalid_dispenser(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_usage_sketches', '--dispenser', 'not-an-id', stdout=StringIO())
@@ -0,0 +1,34 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from api.ids import MAX_VENUE_CODE, venue_uuid, get_venue_code, get_timestamp_ms
+
+
+class VenueUuidTest(SimpleTestCase):
+
+    def test_layout(self):
+        value = venue_uuid(5, timestamp_ms=1700000000123)
+        self.assertEqual(value.version, 8)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertEqual(get_venue_code(value), 5)
+        self.assertEqual(get_timestamp_ms(value), 1700000000123)
+        self.assertTrue(str(value).startswith('0005'))
+
+    def test_time_ordered(self):
+        values = [venue_uuid(3, timestamp_ms=1700000000000 + ms) for ms in range(0, 5000, 3)]
+        self.assertEqual(values, sorted(values))
+
+    def test_venue_prefixed(self):
+        values = [venue_uuid(code, timestamp_ms=1700000000000 - code) for code in range(10)]
+        self.assertEqual(values, sorted(values))
+
+    def test_random_uuid_has_no_venue(self):
+        self.assertIsNone(get_venue_code(uuid.uuid4()))
+
+    def test_venue_code_range(self):
+        self.assertEqual(get_venue_code(venue_uuid(MAX_VENUE_CODE)), MAX_VENUE_CODE)
+        # the codes out of the range of the venue code column are rejected instead of truncated
+        for code in (MAX_VENUE_CODE + 1, -1):
+            with self.assertRaises(ValueError):
+                venue_uuid(code)
@@ -0,0 +1,46 @@
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+from rest_framework import status
+
+from api.middleware import ConcurrencyLimiter, ConcurrencyLimitMiddleware
+
+
+class ConcurrencyLimitMiddlewareTest(TestCase):
+    def setUp(self) -> None:
+        self.limiter = ConcurrencyLimiter(limit=1, timeout=0)
+        self.factory = RequestFactory()
+
+    def test_request_accepted(self):
+        middleware = ConcurrencyLimitMiddleware(lambda request: HttpResponse(), limiter=self.limiter)
+        response = middleware(self.factory.get('/api/dispenser/'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.limiter.get_stats()['accepted'], 1)
+        self.assertEqual(self.limiter.get_stats()['in_flight'], 0)
+
+    def test_request_shed(self):
+        responses = []
+
+        def get_response(request):
+            if request.path != '/api/dispenser/':
+                return HttpResponse()
+            # a second request arrives while this one is being served
+            responses.append(middleware(self.factory.get('/api/dispenser/')))
+            responses.append(middleware(self.factory.get('/api/health/live')))
+            return HttpResponse()
+
+        middleware = ConcurrencyLimitMiddleware(get_response, limiter=self.limiter)
+        response = middleware(self.factory.get('/api/dispenser/'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[0].status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(responses[0]['Retry-After'], '1')
+        # health probes are never shed
+        self.assertEqual(responses[1].status_code, status.HTTP_200_OK)
+        self.assertEqual(self.limiter.get_stats(), {
+            'limit': 1,
+            'in_flight': 0,
+            'max_in_flight': 1,
+            'accepted': 1,
+            'shed': 1
+        })
@@ -3,11 +3,13 @@ from django.conf import settings
 from datetime import datetime
 from decimal import Decimal
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from api.exceptions import DispenserAlreadyOpenOrClosedException
-from api.factory import BeerTapDispenserFactory
-from api.models import BeerTapDispenser, BeerTapDispenserHistory
+from api.factory import BeerTapDispenserFactory, VenueFactory
+from api.ids import get_venue_code
+from api.models import BeerTapDispenser, BeerTapDispenserHistory, get_pricing_fingerprint
+from api.timestamps import utc_now
 
 
 class BeerTapDispenserTest(TestCase):
@@ -83,6 +85,15 @@ class BeerTapDispenserTest(TestCase):
         except DispenserAlreadyOpenOrClosedException:
             self.assertTrue(True)
 
+    def test_open_with_a_stale_instance(self):
+        # both loaded while the dispenser was closed, the second open reads the locked status
+        stale = BeerTapDispenser.objects.get(pk=self.dispenser.pk)
+        self.dispenser.open(timestamp=datetime(2022, 1, 1, 2))
+
+        with self.assertRaises(DispenserAlreadyOpenOrClosedException):
+            stale.open(timestamp=datetime(2022, 1, 1, 2, 0, 1))
+        self.assertEqual(self.dispenser.usages.count(), 1)
+
     def test_close_tab_dispenser_success(self):
         # the dispenser must start closed
         self.assertEqual(self.dispenser.status, BeerTapDispenser.BeerTapDispenserStatus.CLOSED)
@@ -140,11 +151,74 @@ class BeerTapDispenserTest(TestCase):
         total_spent_last = self.dispenser.usages.first().total_spent()
         self.assertEqual(total_spent_last, total_spent_dispenser)
 
+    def test_id_is_venue_prefixed(self):
+        self.assertEqual(get_venue_code(self.dispenser.id), settings.DEFAULT_VENUE_CODE)
+
+        venue = VenueFactory()
+        dispensers = [BeerTapDispenser.objects.create(venue=venue, flow_volume=Decimal('0.0653')) for _ in range(3)]
+        self.assertTrue(all(get_venue_code(d.id) == venue.code for d in dispensers))
+        self.assertEqual(venue.dispensers.count(), 3)
+
+    def test_set_status_increments_version(self):
+        self.assertEqual(self.dispenser.version, 0)
+        etag, last_modified = self.dispenser.get_spending_validators()
+        self.assertEqual(etag, f'"0-{get_pricing_fingerprint()}"')
+
+        self.dispenser.open(timestamp=datetime.now())
+        self.dispenser.refresh_from_db()
+        self.assertEqual(self.dispenser.version, 1)
+        self.assertEqual(self.dispenser.get_spending_validators(), (None, None))
+
+        self.dispenser.closed(timestamp=datetime.now())
+        self.dispenser.refresh_from_db()
+        self.assertEqual(self.dispenser.version, 2)
+        etag, last_modified = self.dispenser.get_spending_validators()
+        self.assertEqual(etag, f'"2-{get_pricing_fingerprint()}"')
+        self.assertGreaterEqual(last_modified, int(self.dispenser.updated_at.timestamp()))
+
+    def test_set_status_version_is_incremented_in_the_database(self):
+        # two instances loaded before either status change
+        stale = BeerTapDispenser.objects.get(pk=self.dispenser.pk)
+        # the new version is not read back by the status change
+        with self.assertNumQueries(1):
+            self.dispenser.set_status(BeerTapDispenser.BeerTapDispenserStatus.OPEN)
+        self.assertEqual(self.dispenser.version, 1)
+        stale.set_status(BeerTapDispenser.BeerTapDispenserStatus.CLOSED)
+
+        self.assertEqual(stale.version, 2)
+        self.dispenser.refresh_from_db()
+        self.assertEqual(self.dispenser.version, 2)
+
+    def test_etag_changes_with_pricing(self):
+        etag, _ = self.dispenser.get_spending_validators()
+        with override_settings(PRICE_BY_LITER=13.5):
+            self.assertNotEqual(self.dispenser.get_spending_validators()[0], etag)
+        with override_settings(MAX_POUR_SECONDS=600):
+            self.assertNotEqual(self.dispenser.get_spending_validators()[0], etag)
+
 
 class BeerTapDispenserHistoryTest(TestCase):
     def setUp(self) -> None:
         self.dispenser = BeerTapDispenserFactory()
 
+    def test_epoch_columns(self):
+        self.dispenser.open(timestamp=datetime(2022, 1, 1, 2))
+        self.dispenser.closed(timestamp=datetime(2022, 1, 1, 2, 0, 22, 500))
+        usage = self.dispenser.usages.get()
+
+        self.assertEqual(usage.opened_at_us, 1641002400000000)
+        self.assertEqual(usage.closed_at_us - usage.opened_at_us, 22000500)
+
+        usages = BeerTapDispenserHistory.objects.bulk_create([
+            BeerTapDispenserHistory(
+                dispenser=self.dispenser,
+                opened_at=datetime(2022, 1, 1, 3),
+                flow_volume=self.dispenser.flow_volume
+            )
+        ])
+        self.assertEqual(usages[0].opened_at_us, 1641006000000000)
+        self.assertIsNone(usages[0].closed_at_us)
+
     def test_history_count(self):
         self.dispenser.open(timestamp=datetime.now())
         items = BeerTapDispenserHistory.objects.all().count()
@@ -169,7 +243,8 @@ class BeerTapDispenserHistoryTest(TestCase):
         self.assertEqual(usage.flow_volume, self.dispenser.flow_volume)
 
     def test_get_time_difference_in_seconds_open(self):
-        self.dispenser.open(timestamp=datetime.now())
+        # the usage instants are UTC
+        self.dispenser.open(timestamp=utc_now())
         items = BeerTapDispenserHistory.objects.all()
         usage = items.first()
 
@@ -177,6 +252,22 @@ class BeerTapDispenserHistoryTest(TestCase):
         self.assertEqual(usage.get_time_difference_in_seconds(), 3)
         self.assertEqual(items.first().closed_at, None)
 
+    @override_settings(MAX_POUR_SECONDS=60)
+    def test_get_time_difference_in_seconds_capped(self):
+        usage = BeerTapDispenserHistory(
+            dispenser=self.dispenser,
+            opened_at=datetime(2022, 1, 1, 2),
+            flow_volume=self.dispenser.flow_volume
+        )
+        self.assertEqual(usage.get_time_difference_in_seconds(), 60)
+
+        usage.closed_at = datetime(2022, 1, 1, 2, 0, 50)
+        self.assertEqual(usage.get_time_difference_in_seconds(), 50)
+
+        # longer than a day
+        usage.closed_at = datetime(2022, 1, 2, 2, 0, 10)
+        self.assertEqual(usage.get_time_difference_in_seconds(), 60)
+
     def test_total_spent_closed(self):
         self.dispenser.open(timestamp=datetime.now())
         items = BeerTapDispenserHistory.objects.all()
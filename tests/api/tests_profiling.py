@@ -0,0 +1,80 @@
+import marshal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.factory import BeerTapDispenserFactory
+from api.profiling import Profile, span, current_profile
+
+
+class ProfileTest(SimpleTestCase):
+    def test_spans(self):
+        profile = Profile(method='PUT', path='/', max_queries=1)
+        token = current_profile.set(profile)
+        try:
+            with span('view'):
+                with span('stage'):
+                    pass
+        finally:
+            current_profile.reset(token)
+        # without a profile the spans do nothing
+        with span('ignored'):
+            pass
+
+        self.assertEqual([s['name'] for s in profile.spans], ['view/stage', 'view'])
+
+
+@override_settings(PROFILING_TOKEN='secret', PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.dispenser = BeerTapDispenserFactory()
+        self.status_url = reverse('api:beertapdispenser-status', kwargs={'pk': self.dispenser.pk})
+        self.open_data = {'status': 'open', 'updated_at': '2022-01-01T02:00:00'}
+
+    def get_profile(self, profile_id, token='secret', **params):
+        url = reverse('api:profile', kwargs={'profile_id': profile_id})
+        return self.client.get(url, params, HTTP_X_PROFILE=token)
+
+    def test_profile_status(self):
+        response = self.client.put(self.status_url, data=self.open_data, format='json', HTTP_X_PROFILE='secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_id = response['X-Profile-Id']
+
+        response = self.get_profile(profile_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['status_code'], status.HTTP_200_OK)
+        spans = [s['name'] for s in data['spans']]
+        for name in (
+            'validation', 'get_object', 'execute_operation/exists',
+            'execute_operation/set_status', 'execute_operation/usages.create'
+        ):
+            self.assertIn(name, spans)
+        self.assertIn('execute_operation/usages.create', [q['span'] for q in data['queries']])
+        self.assertIn('cumulative', data['cprofile'])
+
+        response = self.get_profile(profile_id, format='pstats')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{profile_id}.prof"')
+        self.assertIsInstance(marshal.loads(response.content), dict)
+
+    def test_not_profiled(self):
+        response = self.client.put(self.status_url, data=self.open_data, format='json', HTTP_X_PROFILE='wrong')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled(self):
+        response = self.client.put(self.status_url, data=self.open_data, format='json')
+        self.assertIn('X-Profile-Id', response)
+
+    def test_download_needs_token(self):
+        response = self.client.put(self.status_url, data=self.open_data, format='json', HTTP_X_PROFILE='secret')
+        profile_id = response['X-Profile-Id']
+
+        self.assertEqual(self.get_profile(profile_id, token='wrong').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get_profile('unknown').status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,85 @@
+import io
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.checks import check_json_backend
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(TestCase):
+    def setUp(self) -> None:
+        self.renderer = FastJSONRenderer()
+        self.data = {
+            'amount': Decimal('57.683'),
+            'usages': [
+                {
+                    'opened_at': '2022-01-01T02:00:00',
+                    'closed_at': None,
+                    'flow_volume': Decimal('0.0654'),
+                    'total_spent': Decimal('0.801')
+                }
+            ]
+        }
+
+    def test_render_same_bytes_than_json_renderer(self):
+        self.assertEqual(self.renderer.render(self.data), JSONRenderer().render(self.data))
+
+    def test_render_decimal_as_number(self):
+        self.assertEqual(self.renderer.render({'amount': Decimal('1.500')}), b'{"amount":1.5}')
+
+    def test_render_datetime_and_uuid(self):
+        pk = uuid.uuid4()
+        data = {'id': pk, 'at': datetime(2022, 1, 1, 2, tzinfo=timezone.utc)}
+        self.assertEqual(self.renderer.render(data), JSONRenderer().render(data))
+
+    def test_render_none(self):
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_render_indent(self):
+        rendered = self.renderer.render({'a': 1}, accepted_media_type='application/json; indent=4')
+        self.assertEqual(rendered, b'{\n    "a": 1\n}')
+
+    def test_render_line_separators(self):
+        data = {'text': 'a\u2028b\u2029'}
+        self.assertEqual(self.renderer.render(data), JSONRenderer().render(data))
+
+
+class FastJSONParserTest(TestCase):
+    def setUp(self) -> None:
+        self.parser = FastJSONParser()
+
+    def test_parse_same_data_than_json_parser(self):
+        body = b'{"status": "open", "updated_at": "2022-01-01T02:00:00", "volume": 0.0653}'
+        self.assertEqual(self.parser.parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            self.parser.parse(io.BytesIO(b'{"status": '))
+
+    def test_parse_other_encoding(self):
+        body = '{"status": "open"}'.encode('utf-16')
+        data = self.parser.parse(io.BytesIO(body), parser_context={'encoding': 'utf-16'})
+        self.assertEqual(data, {'status': 'open'})
+
+
+class JSONBackendCheckTest(TestCase):
+
+    @override_settings(JSON_BACKEND='orjson')
+    def test_orjson_not_installed(self):
+        self.assertEqual(check_json_backend(None), [])
+        with mock.patch('api.renderers.orjson', None):
+            self.assertEqual([w.id for w in check_json_backend(None)], ['api.W001'])
+
+    @override_settings(JSON_BACKEND='stdlib')
+    def test_stdlib_backend(self):
+        with mock.patch('api.renderers.orjson', None):
+            self.assertEqual(check_json_backend(None), [])
@@ -0,0 +1,109 @@
+from datetime import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.factory import BeerTapDispenserFactory
+from api.middleware import ReplicaRoutingMiddleware
+from api.models import BeerTapDispenser
+from api.routers import PrimaryReplicaRouter, RoutingState, routing_state, read_from_replica
+
+# a second connection to the test database, the spending queries are checked on a real replica alias
+REPLICA = 'replica_test'
+connections.settings.setdefault(REPLICA, dict(
+    connections.settings['default'], TEST=dict(connections.settings['default']['TEST'], MIRROR='default')
+))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class PrimaryReplicaRouterTest(TestCase):
+    def setUp(self) -> None:
+        self.router = PrimaryReplicaRouter()
+        self.state = RoutingState()
+        token = routing_state.set(self.state)
+        self.addCleanup(routing_state.reset, token)
+
+    @read_from_replica
+    def read_only_action(self):
+        return self.router.db_for_read(BeerTapDispenser)
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(BeerTapDispenser), 'default')
+
+    def test_read_only_action_uses_replica(self):
+        self.assertEqual(self.read_only_action(), 'replica_0')
+        # the flag is restored after the action
+        self.assertFalse(self.state.read_only)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_replica_is_kept_for_the_request(self):
+        with mock.patch('api.routers.random.choice', side_effect=['replica_1', 'replica_0']):
+            self.assertEqual([self.read_only_action() for _ in range(3)], ['replica_1'] * 3)
+
+    def test_read_after_write_uses_primary(self):
+        self.assertEqual(self.router.db_for_write(BeerTapDispenser), 'default')
+        self.assertTrue(self.state.wrote)
+        self.assertEqual(self.read_only_action(), 'default')
+
+    def test_pinned_client_uses_primary(self):
+        self.state.pinned = True
+        self.assertEqual(self.read_only_action(), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.read_only_action(), 'default')
+
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate('default', 'api'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'api'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaSpendingTest(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.dispenser = BeerTapDispenserFactory(flow_volume='0.0640')
+        self.dispenser.open(timestamp=datetime(2022, 1, 1, 2))
+        self.dispenser.closed(timestamp=datetime(2022, 1, 1, 2, 0, 50))
+
+    def test_spending_reads_from_the_replica(self):
+        url = reverse('api:beertapdispenser-spending', kwargs={'pk': self.dispenser.pk})
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], self.dispenser.total_spent())
+        # the dispenser (etag) and its usages are read from the same replica
+        tables = ' '.join(query['sql'] for query in replica.captured_queries)
+        self.assertIn('api_beertapdispenser"', tables)
+        self.assertIn('api_beertapdispenserhistory', tables)
+        self.assertEqual(primary.captured_queries, [])
+
+
+class ReplicaRoutingMiddlewareTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.dispenser = BeerTapDispenserFactory()
+
+    def test_write_pins_the_client(self):
+        url = reverse('api:beertapdispenser-status', kwargs={'pk': self.dispenser.pk})
+        response = self.client.put(url, data={'status': 'open', 'updated_at': '2022-01-01T02:00:00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(ReplicaRoutingMiddleware.cookie_name, response.cookies)
+
+    def test_read_does_not_pin_the_client(self):
+        url = reverse('api:beertapdispenser-spending', kwargs={'pk': self.dispenser.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(ReplicaRoutingMiddleware.cookie_name, response.cookies)
@@ -1,16 +1,20 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 from decimal import Decimal
 from django.test import TestCase
 from django.forms.models import model_to_dict
-from rest_framework.exceptions import ErrorDetail
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.renderers import JSONRenderer
 
 from api.factory import BeerTapDispenserHistoryFactory, BeerTapDispenserFactory
 from api.models import BeerTapDispenser
+from api.timestamps import utc_now
 from api.serializers import (
     BeerTapDispenserSerializer,
     DispenserStatusSerializer,
     SpendingDispenserSerializer,
-    BeerTapDispenserHistorySerializer
+    BeerTapDispenserHistorySerializer,
+    LeanDispenserStatusSerializer,
+    LeanSpendingDispenserSerializer
 )
 
 
@@ -154,3 +158,84 @@ class SpendingDispenserSerializerTest(TestCase):
         total_usages_serializer = sum(usage.get('total_spent') for usage in serializer.data.get('usages'))
         self.assertEqual(total_usages_serializer, self.dispenser.total_spent())
 
+
+class LeanDispenserStatusSerializerTest(TestCase):
+    def setUp(self) -> None:
+        self.serializer_class = LeanDispenserStatusSerializer
+
+    def assert_same_result(self, data):
+        lean = self.serializer_class(data=data)
+        serializer = DispenserStatusSerializer(data=data)
+
+        self.assertEqual(lean.is_valid(), serializer.is_valid())
+        self.assertEqual(lean.validated_data, serializer.validated_data)
+        self.assertEqual(lean.errors, serializer.errors)
+        self.assertEqual(lean.data, serializer.data)
+        return lean
+
+    def test_serializer_success_data(self):
+        data = {
+            'status': BeerTapDispenser.BeerTapDispenserStatus.CLOSED,
+            'updated_at': '2022-11-17T19:00:50'
+        }
+        lean = self.assert_same_result(data)
+        self.assertIsNone(lean.fallback)
+        self.assertEqual(data, lean.data)
+
+    def test_serializer_success_aware_date(self):
+        data = {
+            'status': BeerTapDispenser.BeerTapDispenserStatus.OPEN,
+            'updated_at': '2022-11-17T20:21:31.082Z'
+        }
+        lean = self.assert_same_result(data)
+        self.assertIsNone(lean.fallback)
+
+    def test_serializer_wrong_data_uses_fallback(self):
+        wrong_data = [
+            {'status': 'wrong', 'updated_at': 'XX2020-11-17T19:00:50'},
+            {'status': 'open', 'updated_at': '2022-13-45T19:00:50'},
+            {'status': 'open'},
+            {},
+            ['open'],
+        ]
+        for data in wrong_data:
+            lean = self.assert_same_result(data)
+            self.assertIsNotNone(lean.fallback)
+
+    def test_serializer_raise_exception(self):
+        serializer = self.serializer_class(data={'status': 'wrong'})
+        with self.assertRaises(ValidationError):
+            serializer.is_valid(raise_exception=True)
+
+
+class LeanSpendingDispenserSerializerTest(TestCase):
+    def setUp(self) -> None:
+        self.serializer_class = LeanSpendingDispenserSerializer
+        self.dispenser = BeerTapDispenserFactory()
+        self.renderer = JSONRenderer()
+
+    def assert_same_bytes(self):
+        lean = self.renderer.render(self.serializer_class(self.dispenser).data)
+        serializer = self.renderer.render(SpendingDispenserSerializer(self.dispenser).data)
+        self.assertEqual(lean, serializer)
+
+    def test_serializer_without_usages(self):
+        self.assert_same_bytes()
+
+    def test_serializer_with_usages(self):
+        for seconds in (1, 22, 50, 3601):
+            BeerTapDispenserHistoryFactory(
+                dispenser=self.dispenser,
+                opened_at=datetime(2022, 1, 1, 2),
+                closed_at=datetime(2022, 1, 1, 2) + timedelta(seconds=seconds)
+            )
+        self.assertEqual(self.dispenser.usages.count(), 4)
+        self.assert_same_bytes()
+
+    def test_serializer_usage_open(self):
+        self.dispenser.open(timestamp=utc_now())
+        data = self.serializer_class(self.dispenser).data
+
+        self.assertEqual(len(data.get('usages')), 1)
+        self.assertIsNone(data.get('usages')[0].get('closed_at'))
+        self.assertEqual(data.get('amount'), data.get('usages')[0].get('total_spent'))
@@ -0,0 +1,112 @@
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from api.factory import BeerTapDispenserFactory
+from api.throttling import DispenserStatusThrottle, ClientStatusThrottle, throttled_requests
+
+
+class FakeView:
+    def __init__(self, pk):
+        self.kwargs = {'pk': pk}
+
+
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.now = 1000.0
+        self.request = APIRequestFactory().put('/', REMOTE_ADDR='10.0.0.1')
+
+    def get_throttle(self, throttle_class, rate):
+        throttle = throttle_class()
+        throttle.rate = rate
+        throttle.num_requests, throttle.duration = throttle.parse_rate(rate)
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def test_burst_and_refill(self):
+        throttle = self.get_throttle(DispenserStatusThrottle, '3/s')
+        view = FakeView(pk='dispenser-1')
+
+        self.assertEqual([throttle.allow_request(self.request, view) for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(throttle.wait(), 1 / 3)
+
+        # one token is refilled every third of second
+        self.now += 0.34
+        self.assertTrue(throttle.allow_request(self.request, view))
+        self.assertFalse(throttle.allow_request(self.request, view))
+
+    def test_buckets_by_dispenser(self):
+        throttle = self.get_throttle(DispenserStatusThrottle, '1/min')
+        self.assertTrue(throttle.allow_request(self.request, FakeView(pk='dispenser-1')))
+        self.assertTrue(throttle.allow_request(self.request, FakeView(pk='dispenser-2')))
+        self.assertFalse(throttle.allow_request(self.request, FakeView(pk='dispenser-1')))
+
+    def test_buckets_by_client(self):
+        throttle = self.get_throttle(ClientStatusThrottle, '1/min')
+        other_request = APIRequestFactory().put('/', REMOTE_ADDR='10.0.0.2')
+        throttled = throttled_requests['client_status']
+
+        self.assertTrue(throttle.allow_request(self.request, FakeView(pk='dispenser-1')))
+        self.assertTrue(throttle.allow_request(other_request, FakeView(pk='dispenser-1')))
+        self.assertFalse(throttle.allow_request(self.request, FakeView(pk='dispenser-2')))
+        self.assertEqual(throttled_requests['client_status'], throttled + 1)
+
+    def test_same_bucket_for_the_forms_of_a_dispenser_id(self):
+        throttle = self.get_throttle(DispenserStatusThrottle, '1/min')
+        pk = uuid.uuid4()
+        self.assertTrue(throttle.allow_request(self.request, FakeView(pk=str(pk))))
+        self.assertFalse(throttle.allow_request(self.request, FakeView(pk=str(pk).upper())))
+        self.assertFalse(throttle.allow_request(self.request, FakeView(pk=pk.hex)))
+
+    def test_concurrent_requests_take_distinct_tokens(self):
+        throttle = self.get_throttle(DispenserStatusThrottle, '5/min')
+        view = FakeView(pk='dispenser-1')
+        barrier = threading.Barrier(20)
+        results = []
+        get = LocMemCache.get
+
+        def slow_get(*args, **kwargs):
+            # the other requests read the bucket before this one writes it back
+            value = get(*args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        def request():
+            barrier.wait()
+            results.append(throttle.allow_request(self.request, view))
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        with mock.patch.object(LocMemCache, 'get', slow_get):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results.count(True), 5)
+
+
+class StatusThrottlingApiTest(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_status_throttled(self):
+        btd = BeerTapDispenserFactory()
+        url = reverse('api:beertapdispenser-status', kwargs={'pk': btd.pk})
+        data = {'status': 'closed', 'updated_at': '2022-01-01T02:00:00'}
+
+        num_requests, _ = DispenserStatusThrottle().parse_rate(DispenserStatusThrottle().get_rate())
+        for _ in range(num_requests):
+            response = self.client.put(url, data=data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.put(url, data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
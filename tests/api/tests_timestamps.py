@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase
+
+from api.timestamps import to_epoch_us, from_epoch_us, utc_now, now_us
+
+
+class EpochTest(SimpleTestCase):
+
+    def test_naive_datetimes_are_utc(self):
+        self.assertEqual(to_epoch_us(datetime(1970, 1, 1, 0, 0, 1, 5)), 1000005)
+        self.assertEqual(to_epoch_us(datetime(2022, 1, 1)), 1640995200000000)
+        self.assertIsNone(to_epoch_us(None))
+
+    def test_aware_datetimes(self):
+        lisbon = ZoneInfo('Europe/Lisbon')
+        # summer time, UTC+1
+        value = datetime(2022, 7, 1, 12, tzinfo=lisbon)
+        self.assertEqual(to_epoch_us(value), to_epoch_us(datetime(2022, 7, 1, 11)))
+        self.assertEqual(to_epoch_us(value.astimezone(timezone.utc)), to_epoch_us(value))
+
+    def test_duration_across_dst_change(self):
+        lisbon = ZoneInfo('Europe/Lisbon')
+        # the clocks go back from 02:00 to 01:00 on 2022-10-30, 01:30 happens twice
+        opened_at = datetime(2022, 10, 30, 1, 30, tzinfo=lisbon)
+        closed_at = datetime(2022, 10, 30, 1, 30, fold=1, tzinfo=lisbon)
+        self.assertEqual(to_epoch_us(closed_at) - to_epoch_us(opened_at), 3600 * 1000000)
+
+    def test_round_trip(self):
+        value = datetime(2022, 11, 17, 20, 21, 31, 82000)
+        self.assertEqual(from_epoch_us(to_epoch_us(value)), value)
+
+    def test_now(self):
+        self.assertLess(abs(to_epoch_us(utc_now()) - now_us()), 1000000)